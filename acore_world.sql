@@ -0,0 +1,96 @@
+-- Trimmed AzerothCore world database schema for the SQLite backend.
+-- Only the tables and columns queried by the TourGuide utilities are kept,
+-- the indexes match the primary and secondary keys used for the joins.
+
+CREATE TABLE IF NOT EXISTS quest_template (
+    ID INTEGER NOT NULL PRIMARY KEY,
+    QuestInfoID INTEGER NOT NULL DEFAULT 0,
+    QuestLevel INTEGER NOT NULL DEFAULT 1,
+    MinLevel INTEGER NOT NULL DEFAULT 0,
+    QuestSortID INTEGER NOT NULL DEFAULT 0,
+    RewardNextQuest INTEGER NOT NULL DEFAULT 0,
+    RewardXPDifficulty INTEGER NOT NULL DEFAULT 0,
+    AllowableRaces INTEGER NOT NULL DEFAULT 0,
+    LogTitle TEXT
+);
+CREATE INDEX IF NOT EXISTS quest_template_sort
+    ON quest_template (QuestSortID);
+
+CREATE TABLE IF NOT EXISTS quest_template_addon (
+    ID INTEGER NOT NULL PRIMARY KEY,
+    MaxLevel INTEGER NOT NULL DEFAULT 0,
+    AllowableClasses INTEGER NOT NULL DEFAULT 0,
+    PrevQuestID INTEGER NOT NULL DEFAULT 0,
+    NextQuestID INTEGER NOT NULL DEFAULT 0,
+    ExclusiveGroup INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS creature_template (
+    entry INTEGER NOT NULL PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '0',
+    npcflag INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS creature (
+    guid INTEGER NOT NULL PRIMARY KEY,
+    id INTEGER NOT NULL DEFAULT 0,
+    map INTEGER NOT NULL DEFAULT 0,
+    position_x REAL NOT NULL DEFAULT 0,
+    position_y REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS creature_id ON creature (id);
+CREATE INDEX IF NOT EXISTS creature_map ON creature (map);
+
+CREATE TABLE IF NOT EXISTS creature_queststarter (
+    id INTEGER NOT NULL DEFAULT 0,
+    quest INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, quest)
+);
+CREATE INDEX IF NOT EXISTS creature_queststarter_quest
+    ON creature_queststarter (quest);
+
+CREATE TABLE IF NOT EXISTS creature_questender (
+    id INTEGER NOT NULL DEFAULT 0,
+    quest INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, quest)
+);
+CREATE INDEX IF NOT EXISTS creature_questender_quest
+    ON creature_questender (quest);
+
+CREATE TABLE IF NOT EXISTS gameobject_template (
+    entry INTEGER NOT NULL PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS gameobject (
+    guid INTEGER NOT NULL PRIMARY KEY,
+    id INTEGER NOT NULL DEFAULT 0,
+    map INTEGER NOT NULL DEFAULT 0,
+    position_x REAL NOT NULL DEFAULT 0,
+    position_y REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS gameobject_id ON gameobject (id);
+
+CREATE TABLE IF NOT EXISTS gameobject_queststarter (
+    id INTEGER NOT NULL DEFAULT 0,
+    quest INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, quest)
+);
+CREATE INDEX IF NOT EXISTS gameobject_queststarter_quest
+    ON gameobject_queststarter (quest);
+
+CREATE TABLE IF NOT EXISTS gameobject_questender (
+    id INTEGER NOT NULL DEFAULT 0,
+    quest INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, quest)
+);
+CREATE INDEX IF NOT EXISTS gameobject_questender_quest
+    ON gameobject_questender (quest);
+
+CREATE TABLE IF NOT EXISTS item_template (
+    entry INTEGER NOT NULL PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    startquest INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS item_template_startquest
+    ON item_template (startquest);
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+import zlib
+import queue
+import asyncio
+import sqlite3
+import threading
+import urllib.request
+import concurrent.futures
+
+# available database backends
+BACKENDS = ['mysql', 'sqlite']
+
+# trimmed AzerothCore world schema used for new SQLite databases
+SCHEMA_FIXTURE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'acore_world.sql')
+
+# MySQLdb style placeholders and escaped percent signs
+PLACEHOLDER_RE = re.compile(r"%[s%]")
+
+# lists of placeholders that only differ by the number of values
+PLACEHOLDER_LIST_RE = re.compile(r"\(\s*%s(\s*,\s*%s)*\s*\)")
+
+# upper bounds of the query latency histogram buckets in milliseconds
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class DatabaseError(Exception):
+    """ database of a backend can't be opened """
+
+
+def connect(backend, dbname, user=None, passwd=None, stats=None,
+            create=False):
+    """ open connection to database dbname with one of the BACKENDS,
+    queries of its cursors are recorded in QueryStats stats if given,
+    a SQLite database is only created if create is set """
+    if backend == 'mysql':
+        connection = MysqlBackend(dbname, user, passwd)
+    elif backend == 'sqlite':
+        connection = SqliteBackend(dbname, create)
+    else:
+        raise DatabaseError('Unknown database backend %s' % backend)
+    if stats is not None:
+        connection = InstrumentedBackend(connection, stats)
+    return connection
+
+
+class MysqlBackend:
+    """ AzerothCore world database on a MySQL server """
+
+    def __init__(self, dbname, user, passwd):
+        try:
+            import MySQLdb
+            import MySQLdb.cursors
+        except ImportError as ie:
+            raise DatabaseError("Can't import MySQLdb: %s" % repr(ie))
+        self.sscursor = MySQLdb.cursors.SSCursor
+        try:
+            self.connection = MySQLdb.connect(
+                db=dbname, user=user, passwd=passwd)
+        except MySQLdb.OperationalError as oe:
+            raise DatabaseError(repr(oe))
+
+    def cursor(self, stream=False):
+        """ create cursor, unbuffered server side cursor for streams """
+        if stream:
+            return self.connection.cursor(self.sscursor)
+        return self.connection.cursor()
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteBackend:
+    """ world database in a SQLite file with the trimmed AzerothCore schema
+
+    Without file extension the database is read from dbname.sqlite. An
+    existing database is opened read only, only with create set a missing
+    database file is created and the SCHEMA_FIXTURE is applied.
+    """
+
+    def __init__(self, dbname, create=False):
+        if not os.path.splitext(dbname)[1]:
+            dbname += '.sqlite'
+        if not create and not os.path.isfile(dbname):
+            raise DatabaseError('No SQLite database %s' % dbname)
+        try:
+            if create:
+                self.connection = sqlite3.connect(
+                    dbname, check_same_thread=False)
+                with open(SCHEMA_FIXTURE) as schema:
+                    self.connection.executescript(schema.read())
+            else:
+                self.connection = sqlite3.connect(
+                    'file:%s?mode=ro' % urllib.request.pathname2url(
+                        os.path.abspath(dbname)),
+                    uri=True, check_same_thread=False)
+        except (OSError, sqlite3.Error) as err:
+            raise DatabaseError(repr(err))
+
+        # MySQL functions used by the queries
+        self.connection.create_function('CRC32', 1, crc32)
+        self.connection.create_function('CONCAT_WS', -1, concat_ws)
+
+    def cursor(self, stream=False):
+        """ create cursor, rows of streams are not stored on the client """
+        return SqliteCursor(self.connection.cursor(), stream)
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteCursor:
+    """ SQLite cursor behaving like a MySQLdb cursor
+
+    Queries use MySQLdb placeholders and execute() returns the number of
+    rows like MySQLdb does for buffered cursors.
+    """
+
+    def __init__(self, cursor, stream=False):
+        self.cursor = cursor
+        self.stream = stream
+        self.rows = []
+        self.pos = 0
+
+    def execute(self, query, args=None):
+        if args is not None:
+            query = PLACEHOLDER_RE.sub(
+                lambda match: '?' if match.group(0) == '%s' else '%', query)
+        self.cursor.execute(query, args or ())
+        if self.stream:
+            return 0
+        self.rows = self.cursor.fetchall()
+        self.pos = 0
+        return len(self.rows)
+
+    def fetchone(self):
+        if self.stream:
+            return self.cursor.fetchone()
+        if self.pos >= len(self.rows):
+            return None
+        self.pos += 1
+        return self.rows[self.pos - 1]
+
+    def fetchall(self):
+        if self.stream:
+            return tuple(self.cursor.fetchall())
+        rows = self.rows[self.pos:]
+        self.pos = len(self.rows)
+        return tuple(rows)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self.cursor.close()
+
+
+class QueryStats:
+    """ calls, returned rows and latency histogram of each SQL template
+
+    Templates are queries with whitespace collapsed and lists of
+    placeholders shortened, so chunked IN (...) queries are counted
+    together. Queries taking longer than slow milliseconds are logged.
+    """
+
+    def __init__(self, slow=None, stream=sys.stderr):
+        self.slow = slow
+        self.stream = stream
+        self.templates = {}
+        self.lock = threading.Lock()
+
+    def template(self, query):
+        """ get SQL template of a query """
+        return PLACEHOLDER_LIST_RE.sub('(...)', ' '.join(query.split()))
+
+    def record(self, query, args, seconds):
+        """ record a call of a query and return its template """
+        template = self.template(query)
+        milliseconds = seconds * 1000
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and \
+                milliseconds > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        with self.lock:
+            if template not in self.templates:
+                # calls, rows, total and maximum time, histogram
+                self.templates[template] = [
+                    0, 0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            stats = self.templates[template]
+            stats[0] += 1
+            stats[2] += milliseconds
+            stats[3] = max(stats[3], milliseconds)
+            stats[4][bucket] += 1
+        if self.slow is not None and milliseconds >= self.slow:
+            print('SLOW QUERY %.1f ms: %s %s' % (
+                milliseconds, template, repr(args)[:200]), file=self.stream)
+        return template
+
+    def add_rows(self, template, num):
+        """ add rows returned by a query of template """
+        with self.lock:
+            self.templates[template][1] += num
+
+    def percentile(self, histogram, fraction):
+        """ get upper bound of the bucket holding a fraction of calls """
+        limit = fraction * sum(histogram)
+        count = 0
+        for bucket, num in enumerate(histogram):
+            count += num
+            if count >= limit:
+                break
+        if bucket < len(LATENCY_BUCKETS):
+            return '%d' % LATENCY_BUCKETS[bucket]
+        return '>%d' % LATENCY_BUCKETS[-1]
+
+    def print_summary(self, stream=None):
+        """ print table of templates ordered by their total time """
+        stream = self.stream if stream is None else stream
+        print('\n%6s %8s %10s %8s %6s %6s %8s  %s' % (
+            'calls', 'rows', 'total ms', 'mean ms', 'p50', 'p95', 'max ms',
+            'query'), file=stream)
+        for template, (calls, rows, total, slowest, histogram) in sorted(
+                self.templates.items(), key=lambda item: -item[1][2]):
+            print('%6d %8d %10.1f %8.2f %6s %6s %8.1f  %s' % (
+                calls, rows, total, total / calls,
+                self.percentile(histogram, 0.5),
+                self.percentile(histogram, 0.95), slowest, template[:100]),
+                file=stream)
+            print('%60s%s' % ('', ' '.join(
+                '<=%d:%d' % (bound, num) if bound else '>%d:%d' % (
+                    LATENCY_BUCKETS[-1], num)
+                for bound, num in zip(LATENCY_BUCKETS + [None], histogram)
+                if num)), file=stream)
+
+
+class InstrumentedBackend:
+    """ connection of a backend with cursors recording their queries """
+
+    def __init__(self, connection, stats):
+        self.connection = connection
+        self.stats = stats
+
+    def cursor(self, stream=False):
+        return InstrumentedCursor(self.connection.cursor(stream), self.stats)
+
+    def close(self):
+        self.connection.close()
+
+
+class InstrumentedCursor:
+    """ cursor recording calls, latency and fetched rows in QueryStats """
+
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+        self.template = None
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return self.cursor.execute(query, args)
+        finally:
+            self.template = self.stats.record(
+                query, args, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.add_rows(self.template, 1)
+        return row
+
+    def fetchmany(self, size):
+        rows = self.cursor.fetchmany(size)
+        self.stats.add_rows(self.template, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.add_rows(self.template, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self.cursor.close()
+
+
+class CursorPool:
+    """ bounded pool of cursors on their own connections for worker threads
+
+    Each worker thread takes a cursor from the pool for a query, so no
+    connection is used by two threads at the same time.
+    """
+
+    def __init__(self, backend, dbname, user=None, passwd=None, size=4,
+                 stats=None):
+        self.connections = [connect(backend, dbname, user, passwd, stats)
+                            for num in range(size)]
+        self.size = size
+        self.cursors = queue.Queue()
+        for connection in self.connections:
+            self.cursors.put(connection.cursor())
+        self.executor = concurrent.futures.ThreadPoolExecutor(size)
+
+    def query(self, query, args=None):
+        """ run a query on a free cursor and return all rows """
+        cursor = self.cursors.get()
+        try:
+            cursor.execute(query, args)
+            return cursor.fetchall()
+        finally:
+            self.cursors.put(cursor)
+
+    def map(self, queries):
+        """ run (query, args) pairs concurrently, rows in order of queries """
+        return list(self.executor.map(lambda job: self.query(*job), queries))
+
+    def close(self):
+        self.executor.shutdown()
+        for connection in self.connections:
+            connection.close()
+
+
+class AsyncQueryRunner:
+    """ run queries from asyncio with at most window queries in flight
+
+    MySQL queries use the aiomysql client when it is installed, otherwise
+    and for SQLite they run on a CursorPool of window connections.
+    """
+
+    def __init__(self, backend, dbname, user=None, passwd=None, window=32,
+                 stats=None):
+        self.backend = backend
+        self.dbname = dbname
+        self.user = user
+        self.passwd = passwd
+        self.window = window
+        self.stats = stats
+        self.semaphore = None
+        self.aiopool = None
+        self.pool = None
+
+    async def open(self):
+        self.semaphore = asyncio.Semaphore(self.window)
+        if self.backend == 'mysql':
+            try:
+                import aiomysql
+            except ImportError:
+                aiomysql = None
+            if aiomysql is not None:
+                try:
+                    self.aiopool = await aiomysql.create_pool(
+                        db=self.dbname, user=self.user, password=self.passwd,
+                        minsize=1, maxsize=self.window)
+                except aiomysql.OperationalError as oe:
+                    raise DatabaseError(repr(oe))
+                return
+        self.pool = CursorPool(self.backend, self.dbname, self.user,
+                               self.passwd, self.window, self.stats)
+
+    async def query(self, query, args=None):
+        """ run a query and return all rows """
+        async with self.semaphore:
+            if self.aiopool is None:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.pool.executor, self.pool.query, query, args)
+            async with self.aiopool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    start = time.perf_counter()
+                    await cursor.execute(query, args)
+                    rows = await cursor.fetchall()
+                    if self.stats is not None:
+                        template = self.stats.record(
+                            query, args, time.perf_counter() - start)
+                        self.stats.add_rows(template, len(rows))
+                    return rows
+
+    async def close(self):
+        if self.aiopool is not None:
+            self.aiopool.close()
+            await self.aiopool.wait_closed()
+        if self.pool is not None:
+            self.pool.close()
+
+
+def crc32(value):
+    """ MySQL CRC32() of a string """
+    if value is None:
+        return None
+    return zlib.crc32(str(value).encode())
+
+
+def concat_ws(separator, *values):
+    """ MySQL CONCAT_WS() skipping NULL values """
+    return separator.join(str(value) for value in values if value is not None)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import os
+import ast
+import sqlite3
+import threading
+
+# file name of the lookup cache inside the cache directory
+CACHE_FILE = 'dblookups.sqlite'
+
+# default number of cached lookups kept before evicting the least recent
+CACHE_SIZE = 100000
+
+# number of keys read or evicted with a single statement
+CACHE_CHUNK = 500
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS lookups (
+        dbname TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        key INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        used INTEGER NOT NULL,
+        PRIMARY KEY (dbname, kind, key)
+    );
+    CREATE INDEX IF NOT EXISTS lookups_used ON lookups (used);
+    CREATE TABLE IF NOT EXISTS fingerprints (
+        dbname TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+    );"""
+
+# query for a fingerprint of the world database, it changes whenever rows
+# are added to or removed from the tables the lookups are based on
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM quest_template),
+        (SELECT MAX(ID) FROM quest_template),
+        (SELECT COUNT(*) FROM quest_template_addon),
+        (SELECT COUNT(*) FROM creature_queststarter),
+        (SELECT COUNT(*) FROM creature_questender),
+        (SELECT COUNT(*) FROM gameobject_queststarter),
+        (SELECT COUNT(*) FROM gameobject_questender),
+        (SELECT COUNT(*) FROM creature),
+        (SELECT MAX(guid) FROM creature),
+        (SELECT COUNT(*) FROM gameobject),
+        (SELECT MAX(guid) FROM gameobject),
+        (SELECT MAX(entry) FROM item_template)"""
+
+
+def fingerprint(dbc):
+    """ get fingerprint of the world database behind cursor dbc """
+    dbc.execute(FINGERPRINT_QUERY)
+    return ','.join(str(value) for value in dbc.fetchone())
+
+
+class LookupCache:
+    """ persistent cache of database lookups in a SQLite file
+
+    Lookups are stored by database name, kind of lookup and an integer key,
+    values are stored as Python literals. All lookups of a database are
+    dropped when its fingerprint changes. The least recently used lookups
+    are evicted when more than size lookups are cached. The cache can be
+    shared by threads, accesses are serialized by a lock.
+    """
+
+    def __init__(self, directory, dbname, fingerprint, size=CACHE_SIZE,
+                 refresh=False):
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(
+            os.path.join(directory, CACHE_FILE), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.executescript(CACHE_SCHEMA)
+        self.dbname = dbname
+        self.size = size
+
+        # drop outdated lookups
+        row = self.db.execute(
+            'SELECT fingerprint FROM fingerprints WHERE dbname = ?',
+            (dbname,)).fetchone()
+        if refresh or row is None or row[0] != fingerprint:
+            self.db.execute('DELETE FROM lookups WHERE dbname = ?', (dbname,))
+            self.db.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?)',
+                (dbname, fingerprint))
+            self.db.commit()
+
+        # access counter for least recently used eviction
+        self.clock = self.db.execute(
+            'SELECT COALESCE(MAX(used), 0) FROM lookups').fetchone()[0]
+
+    def get(self, kind, keys):
+        """ get dict of cached values for keys of a kind of lookup """
+        keys = sorted(set(keys))
+        result = {}
+        with self.lock:
+            self.clock += 1
+            for start in range(0, len(keys), CACHE_CHUNK):
+                chunk = keys[start:start + CACHE_CHUNK]
+                marks = ','.join(['?'] * len(chunk))
+                for key, value in self.db.execute(
+                        'SELECT key, value FROM lookups WHERE dbname = ? AND '
+                        'kind = ? AND key IN (%s)' % marks,
+                        [self.dbname, kind] + chunk):
+                    result[key] = ast.literal_eval(value)
+                self.db.execute(
+                    'UPDATE lookups SET used = ? WHERE dbname = ? AND '
+                    'kind = ? AND key IN (%s)' % marks,
+                    [self.clock, self.dbname, kind] + chunk)
+        return result
+
+    def put(self, kind, values):
+        """ store dict of values for keys of a kind of lookup
+
+        Values without key are skipped, each batch is committed at once.
+        """
+        with self.lock:
+            self.clock += 1
+            self.db.executemany(
+                'INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?)',
+                [(self.dbname, kind, key, repr(value), self.clock)
+                 for key, value in values.items() if key is not None])
+            self.db.commit()
+
+    def close(self):
+        """ evict least recently used lookups and write cache to disk """
+        with self.lock:
+            count = self.db.execute(
+                'SELECT COUNT(*) FROM lookups').fetchone()[0]
+            if count > self.size:
+                self.db.execute(
+                    'DELETE FROM lookups WHERE rowid IN (SELECT rowid FROM '
+                    'lookups ORDER BY used LIMIT ?)', (count - self.size,))
+            self.db.commit()
+            self.db.close()
@@ -2,8 +2,19 @@
 import re
 import sys
 import math
+import atexit
 import pprint
+import asyncio
 import argparse
+import importlib
+import sqlite3
+import dbcache
+import dbbackend
+import questdb
+import geometry
+import questgraph
+import spatial
+import spawndb
 
 # prettyprinter
 PP = pprint.PrettyPrinter(indent=4)
@@ -73,11 +84,26 @@ ACTIONS = {
 # quest dict - either filled by import or by database query
 QUESTS = {}
 
+# cache of quest information from the database
+QUESTS_CACHE = {}
+
+# index of QUESTS by title, built when a quest step has no QID
+TITLEINDEX = None
+
+# steps without QID were already reported as not resolvable by title
+TITLENOTED = False
+
+# insert QIDs found by title instead of only suggesting them
+INSERTQIDS = False
+
 # expansion max quest ID
 MAX_QID_BY_EXPANSION = {
     0:  9665
 }
 
+# variant of quest and area information without -x or a snapshot variant
+DEFAULT_EXPANSION = 'pre'
+
 # current file and line number
 CURRENTFILE = None
 CURRENTLINE = 0
@@ -108,10 +134,19 @@ TAGORDER = [
 # compiled regular expression for coordinates in step note
 NOTE_COORD_RE = re.compile(r"\(\s*(\d+|\d+\.\d+)\s*,\s*(\d+|\d+\.\d+)\s*\)")
 
+# compiled regular expression for tags with quest ids in a step
+QID_TAGS_RE = re.compile(
+    r"\|\s*(QID|ACTIVE|AVAILABLE)\s*\|([^|]*)", re.IGNORECASE)
+
 # sets of started quests and completed quests
 QID_STARTED = []
 QID_COMPLETED = []
 
+# step number, file and line of started and completed quests
+QID_STARTED_AT = {}
+QID_COMPLETED_AT = {}
+STEPCOUNT = 0
+
 # dict of AREAS to track
 QID_AREAS = {}
 
@@ -122,6 +157,98 @@ QID_CLASSES = 0
 # database connection cursor for querying information
 DBC = None
 
+# persistent cache of database lookups across runs
+DBCACHE = None
+
+# pool of database cursors on worker threads for prefetching
+DBPOOL = None
+
+# calls and latency of the database queries
+DBSTATS = None
+
+# query for quests with their addon information
+QUEST_QUERY = """
+    SELECT
+        qt.ID,
+        qt.LogTitle,
+        qt.QuestLevel,
+        qt.MinLevel,
+        qa.MaxLevel,
+        qt.QuestSortID,
+        qt.QuestInfoID,
+        qa.PrevQuestID,
+        qa.NextQuestID,
+        qa.ExclusiveGroup,
+        qt.RewardNextQuest,
+        qt.RewardXPDifficulty,
+        qt.AllowableRaces,
+        qa.AllowableClasses
+    FROM quest_template AS qt
+    INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID"""
+
+# queries for quest starters and enders of a list of quests, the first
+# column is the quest id followed by a row for dbupdate_at_location
+STARTER_CREATURE_QUERY = """
+    SELECT qt.ID, ct.name, c.map, c.position_x, c.position_y
+    FROM quest_template AS qt
+        INNER JOIN creature_queststarter AS cq ON qt.ID = cq.quest
+        INNER JOIN creature_template AS ct ON cq.id = ct.entry
+        INNER JOIN creature AS c ON cq.id = c.id
+    WHERE qt.ID IN (%s)"""
+STARTER_GAMEOBJECT_QUERY = """
+    SELECT qt.ID, gt.name, g.map, g.position_x, g.position_y
+    FROM quest_template AS qt
+        INNER JOIN gameobject_queststarter AS gq ON qt.ID = gq.quest
+        INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
+        INNER JOIN gameobject AS g ON gt.entry = g.id
+    WHERE qt.ID IN (%s)"""
+STARTER_ITEM_QUERY = """
+    SELECT qt.ID, it.name, it.entry
+    FROM quest_template AS qt
+        INNER JOIN item_template AS it ON qt.ID = it.startquest
+    WHERE it.startquest IN (%s)"""
+ENDER_CREATURE_QUERY = """
+    SELECT qt.ID, ct.name, c.map, c.position_x, c.position_y
+    FROM quest_template AS qt
+        INNER JOIN creature_questender AS cq ON qt.ID = cq.quest
+        INNER JOIN creature_template AS ct ON cq.id = ct.entry
+        INNER JOIN creature AS c ON cq.id = c.id
+    WHERE qt.ID IN (%s)"""
+ENDER_GAMEOBJECT_QUERY = """
+    SELECT qt.ID, gt.name, g.map, g.position_x, g.position_y
+    FROM quest_template AS qt
+        INNER JOIN gameobject_questender AS gq ON qt.ID = gq.quest
+        INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
+        INNER JOIN gameobject AS g ON gt.entry = g.id
+    WHERE qt.ID IN (%s)"""
+
+# number of quests fetched with a single query when prefetching
+PREFETCH_CHUNK = 500
+
+# lines of the first block of a guide looked up together in asyncio mode,
+# a block is processed once its lookups are done while those of later
+# blocks are in flight, blocks double in size up to PIPELINE_MAX lines
+PIPELINE_LINES = 64
+PIPELINE_MAX = 4096
+
+# quest starters (creatures, gameobjects, items) and
+# enders (creatures, gameobjects) from the database by qid
+QUEST_STARTERS = {}
+QUEST_ENDERS = {}
+
+# flight masters and their k-d tree by map, loaded once for all guides
+FLIGHTMASTERS = {}
+
+# quest starters, enders and flight masters without database connection
+SPAWNS = None
+
+# AREAS compiled for coordinate conversion
+AREACOORDS = None
+
+# M tags of quest steps to check against the spawns of their quest:
+# file, line, action, qid, zone, x, y
+COORDCHECKS = None
+
 
 # -----------------------------------------------------------------------------
 
@@ -378,7 +505,6 @@ def tag_na():
 
 def dbupdate_A(parsed):
     """ update A action from database information """
-    global DBC
 
     # get qid from QID or ACTIVE tag, convert to int
     qid = None
@@ -388,49 +514,30 @@ def dbupdate_A(parsed):
         qid = parsed['AVAILABLE']
     try:
         qid = int(qid)
-    except ValueError:
+    except (TypeError, ValueError):
         return
 
     # retrieve quest information
     quest = get_quest_info(qid)
     if quest is None:
         return
+    creatures, gameobjects, items = get_quest_starters(qid)
 
     # check 1: quest is offered by an NPC
-    num = DBC.execute(
-        """SELECT ct.name, c.map, c.position_x, c.position_y
-        FROM quest_template AS qt
-            INNER JOIN creature_queststarter AS cq ON qt.ID = cq.quest
-            INNER JOIN creature_template AS ct ON cq.id = ct.entry
-            INNER JOIN creature AS c ON cq.id = c.id
-        WHERE qt.ID = %s""", (qid,))
-    if num > 0:
-        dbupdate_at_location(parsed, dbresult=DBC.fetchall())
+    if creatures:
+        dbupdate_at_location(parsed, dbresult=creatures)
         return
 
     # check 2: quest is offered by an gameobject
-    num = DBC.execute(
-        """SELECT gt.name, g.map, g.position_x, g.position_y
-        FROM quest_template AS qt
-            INNER JOIN gameobject_queststarter AS gq ON qt.ID = gq.quest
-            INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
-            INNER JOIN gameobject AS g ON gt.entry = g.id
-        WHERE qt.ID = %s""", (qid, ))
-    if num > 0:
-        dbupdate_at_location(parsed, dbresult=DBC.fetchall())
+    if gameobjects:
+        dbupdate_at_location(parsed, dbresult=gameobjects)
         return
 
     # check 3: quest is offered by an item in the inventory
-    num = DBC.execute(
-        """SELECT it.name, it.entry
-        FROM quest_template AS qt
-            INNER JOIN item_template AS it ON qt.ID = it.startquest
-        WHERE it.startquest = %s""", (qid, ))
-    if num > 0:
+    if items:
         # if there are multiple results use the one with the higher id
         # this is only the case with items 6766 and 20310
-        dbresult = DBC.fetchall()
-        for result in sorted(dbresult, key=lambda x: -x[1]):
+        for result in sorted(items, key=lambda x: -x[1]):
             update_parsed_entry(parsed, 'N', 'From ' + result[0])
             update_parsed_entry(parsed, 'O', True)
             update_parsed_entry(parsed, 'U', str(result[1]))
@@ -443,7 +550,6 @@ def dbupdate_A(parsed):
 
 def dbupdate_T(parsed):
     """ update T action from database information """
-    global DBC
 
     # get qid from QID tag
     if 'QID' not in parsed:
@@ -457,29 +563,16 @@ def dbupdate_T(parsed):
     quest = get_quest_info(qid)
     if quest is None:
         return
+    creatures, gameobjects = get_quest_enders(qid)
 
     # check 1: quest ends at an NPC
-    num = DBC.execute(
-        """SELECT ct.name, c.map, c.position_x, c.position_y
-        FROM quest_template AS qt
-            INNER JOIN creature_questender AS cq ON qt.ID = cq.quest
-            INNER JOIN creature_template AS ct ON cq.id = ct.entry
-            INNER JOIN creature AS c ON cq.id = c.id
-        WHERE qt.ID = %s""", (qid,))
-    if num > 0:
-        dbupdate_at_location(parsed, dbresult=DBC.fetchall())
+    if creatures:
+        dbupdate_at_location(parsed, dbresult=creatures)
         return
 
     # check 2: quest ends at an gameobject
-    num = DBC.execute(
-        """SELECT gt.name, g.map, g.position_x, g.position_y
-        FROM quest_template AS qt
-            INNER JOIN gameobject_questender AS gq ON qt.ID = gq.quest
-            INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
-            INNER JOIN gameobject AS g ON gt.entry = g.id
-        WHERE qt.ID = %s""", (qid, ))
-    if num > 0:
-        dbupdate_at_location(parsed, dbresult=DBC.fetchall())
+    if gameobjects:
+        dbupdate_at_location(parsed, dbresult=gameobjects)
         return
 
     # something is not quite right when the qid exists but there is no starter
@@ -498,40 +591,52 @@ def dbupdate_F(parsed):
         return
 
     # look up all flight masters on current map
-    num = DBC.execute(
-        """SELECT ct.name, c.map, c.position_x, c.position_y
-        FROM creature_template AS ct
-        INNER JOIN creature AS c on ct.entry = c.id
-        WHERE ct.npcflag & 8192 AND c.map = %s""", (LASTLOCATION[0],)
-    )
-    if num == 0:
+    flightmasters, tree = get_flight_masters(LASTLOCATION[0])
+    if not flightmasters:
         error("%s tag, but No flight masters found on map %d" % (
             parsed['ACTION'], LASTLOCATION[0]))
         return
 
-    # sort database result by distance from current location
-    dbres = list(DBC.fetchall())
-    if len(dbres) > 1:
-        dbres.sort(
-            key=lambda pos: float('inf') if LASTLOCATION[0] != pos[1] else
-            math.sqrt((LASTLOCATION[1] - pos[2]) ** 2 + (
-                    LASTLOCATION[2] - pos[3]) ** 2))
+    # use flight master nearest to current location
+    nearest = flightmasters[tree.nearest(LASTLOCATION[1], LASTLOCATION[2])]
 
     # update coordinates
-    coordstr = get_thott_coordstr(parsed, dbres[0][1], dbres[0][2], dbres[0][3])
+    coordstr = get_thott_coordstr(parsed, nearest[1], nearest[2], nearest[3])
     if coordstr is not None:
         update_parsed_entry(parsed, 'Z', coordstr[0])
         update_parsed_entry(parsed, 'M', coordstr[1])
 
     # update note
-    if 'N' not in parsed or parsed['N'].find(dbres[0][0]) < 0:
-        update_parsed_entry(parsed, 'N', 'At %s.' % dbres[0][0])
+    if 'N' not in parsed or parsed['N'].find(nearest[0]) < 0:
+        update_parsed_entry(parsed, 'N', 'At %s.' % nearest[0])
 
 
 def dbupdate_f(parsed):
     dbupdate_F(parsed)
 
 
+def get_flight_masters(map):
+    """ get flight masters on a map and a k-d tree of their positions """
+    if map not in FLIGHTMASTERS:
+        cached = {} if DBCACHE is None else DBCACHE.get('flightmasters', [map])
+        if DBC is None:
+            flightmasters = SPAWNS.flight_masters(map)
+        elif map in cached:
+            flightmasters = cached[map]
+        else:
+            DBC.execute(
+                """SELECT ct.name, c.map, c.position_x, c.position_y
+                FROM creature_template AS ct
+                INNER JOIN creature AS c on ct.entry = c.id
+                WHERE ct.npcflag & 8192 AND c.map = %s""", (map,))
+            flightmasters = [tuple(entry) for entry in DBC.fetchall()]
+            if DBCACHE is not None:
+                DBCACHE.put('flightmasters', {map: flightmasters})
+        FLIGHTMASTERS[map] = (flightmasters, spatial.KDTree(
+            (entry[2], entry[3]) for entry in flightmasters))
+    return FLIGHTMASTERS[map]
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -550,12 +655,18 @@ def dbupdate_at_location(parsed, dbresult):
 
     # special processing on the first database result
     first = True
+    coordstrs = None
     if dbresult is not None:
-        for se in dbresult:
+        for num, se in enumerate(dbresult):
 
-            # get coordinates
+            # get coordinates, the results after the first are converted
+            # at once, preferring the zone set by the first result
             coords = None
-            if all(v is not None for v in [se[1], se[2], se[3]]):
+            if num == 1:
+                coordstrs = get_thott_coordstrs(parsed, dbresult[1:])
+            if coordstrs is not None:
+                coords = coordstrs[num - 1]
+            elif all(v is not None for v in [se[1], se[2], se[3]]):
                 coords = get_thott_coordstr(parsed, se[1], se[2], se[3])
 
             # update note if it does not contain name
@@ -582,12 +693,52 @@ def dbupdate_at_location(parsed, dbresult):
                 if note is not None:
                     src['N'] = note
                 if coords is not None:
-                    src['Z'] = coords[1]
-                    src['M'] = coords[0]
+                    src['Z'] = coords[0]
+                    src['M'] = coords[1]
                 print('; ALT: ' + generate_tourguide(src), file=sys.stderr)
                 print('; ALT: ' + generate_tourguide(src))
 
 
+def update_qid_from_title(parsed):
+    """ suggest or insert QID of a quest step found by its title """
+    global TITLEINDEX, TITLENOTED
+
+    # the index needs all quests, so it is not available with the database
+    if DBC is not None:
+        if not TITLENOTED:
+            TITLENOTED = True
+            error("QID missing, finding QIDs by title is disabled with the "
+                  "database, further steps are not reported", guidenote=False)
+        return
+    if TITLEINDEX is None:
+        TITLEINDEX = questdb.TitleIndex(QUESTS)
+
+    # quests of the step zone are preferred
+    zone = parsed.get('Z', CURRENTZONE)
+    sort = None
+    for arealist in AREAS.values():
+        if zone in arealist:
+            sort = arealist[zone][0]
+            break
+
+    # only a match passing the zone and faction filters is inserted
+    if INSERTQIDS:
+        qids = TITLEINDEX.find(parsed['TITLE'], sort, QID_RACES, strict=True)
+        if len(qids) == 1:
+            parsed['QID'] = str(qids[0])
+            error("QID %d inserted for '%s'" % (qids[0], parsed['TITLE']))
+            return
+
+    qids = TITLEINDEX.find(parsed['TITLE'], sort, QID_RACES)
+    if len(qids) == 1:
+        error("QID missing, suggested QID %d for '%s'" % (
+            qids[0], parsed['TITLE']), guidenote=INSERTQIDS)
+    elif len(qids) > 1:
+        error("QID missing, candidates for '%s': %s" % (
+            parsed['TITLE'], ', '.join(str(qid) for qid in sorted(qids))),
+            guidenote=INSERTQIDS)
+
+
 def update_from_quest(parsed, quest):
     """ update TourGuide entry from quest information """
 
@@ -646,60 +797,116 @@ def get_thott_coordstr(parsed, map, posx, posy):
     zone = CURRENTZONE
     if 'Z' in parsed:
         zone = parsed['Z']
-    coords = get_thott_coords(map, posx, posy, zone)
+    coords = AREACOORDS.cached_coords(map, posx, posy, zone)
     if coords is None:
-        coords = get_thott_coords(map, posx, posy)
+        coords = AREACOORDS.cached_coords(map, posx, posy)
     if coords is not None:
         return coords[2], "{0:.2f},{1:.2f}".format(coords[0] + 0.005,
                                                    coords[1] + 0.005)
     return None
 
 
-def get_thott_coords(map, posX, posY, zone=None):
-    """ convert world coordinates to thottbot coordinates """
+def get_thott_coordstrs(parsed, dbresult):
+    """ get thott coordinate strings for database results with positions
+    in columns 1 to 3, converted as a batch """
 
-    # bail early if map is not in AREAS
-    if map not in AREAS:
-        return None
+    # find coordinates for current zone or set zone first
+    zone = CURRENTZONE
+    if 'Z' in parsed:
+        zone = parsed['Z']
+    rows = [num for num, se in enumerate(dbresult)
+            if all(v is not None for v in [se[1], se[2], se[3]])]
+    coords = [None] * len(dbresult)
+    if rows:
+        for num, coord in zip(rows, AREACOORDS.coords(
+                *zip(*[dbresult[num][1:4] for num in rows]), zone=zone)):
+            coords[num] = coord
+    missing = [num for num in rows if coords[num] is None]
+    if missing and zone is not None:
+        for num, coord in zip(missing, AREACOORDS.coords(
+                *zip(*[dbresult[num][1:4] for num in missing]))):
+            coords[num] = coord
+
+    return [None if coord is None else (coord[2], "{0:.2f},{1:.2f}".format(
+        coord[0] + 0.005, coord[1] + 0.005)) for coord in coords]
+
+
+def record_coords(parsed):
+    """ record M tag coordinates of an A or T step for check_coords() """
+
+    # get qid of the quest started or ended at the coordinates
+    if 'M' not in parsed or parsed['ACTION'] not in ('A', 'T', 't'):
+        return
+    qid = parsed.get('QID')
+    if parsed['ACTION'] == 'A' and qid is None:
+        qid = parsed.get('AVAILABLE')
+    try:
+        qid = int(qid)
+    except (TypeError, ValueError):
+        return
 
-    # record best match
-    area = None
-    tmap = None
-    thottX = None
-    thottY = None
-    tdist = 71.0
+    zone = parsed.get('Z', CURRENTZONE)
+    for coords in parsed['M'].split(';'):
+        x, y = coords.split(',')
+        COORDCHECKS.append((CURRENTFILE, CURRENTLINE, parsed['ACTION'], qid,
+                            zone, float(x), float(y)))
 
-    # iterate through all areas in the map
-    for zname, zinfo in AREAS[map].items():
 
-        # check if the coordinates fall inside mapping boundaries
-        if not zinfo[1] >= posY >= zinfo[2] or not zinfo[3] >= posX >= zinfo[4]:
-            continue
+def check_coords(tolerance):
+    """ print M tags further than tolerance yards away from the nearest
+    spawn of the quest starter or ender of their step """
 
-        # calculate thottbot coordinates and distance from center (50,50)
-        tX = (posY - zinfo[1]) / (zinfo[2] - zinfo[1]) * 100
-        tY = (posX - zinfo[3]) / (zinfo[4] - zinfo[3]) * 100
-        tD = math.sqrt((50.0 - tX) ** 2 + (50.0 - tY) ** 2)
-
-        # return coordinates if zone was explicitly requested
-        if zone is not None and zone == zname:
-            return tX, tY, zname
-
-        # hack to find correct zone in the overlapping area list:
-        # we use the area with thottbot coordinates closest to the center
-        # except for the global zones with an id of zero (Azeroth, Kalimdor)
-        if area is None or tmap == 0 or (zinfo[0] > 0 and tdist > tD):
-            area = zname
-            tmap = zinfo[0]
-            thottX = tX
-            thottY = tY
-            tdist = tD
-
-    # return either best match or none
-    if area is not None:
-        return thottX, thottY, area
-    else:
-        return None
+    # fetch starters and enders of all checked quests at once
+    starters = {qid for file, line, action, qid, *coords in COORDCHECKS
+                if action == 'A' and qid not in QUEST_STARTERS}
+    enders = {qid for file, line, action, qid, *coords in COORDCHECKS
+              if action != 'A' and qid not in QUEST_ENDERS}
+    if DBC is not None:
+        prefetch_quest_locations(starters, enders)
+
+    # project the M tags to world positions and compare them to the
+    # creature and gameobject spawns of their quests
+    positions = AREACOORDS.to_world(*[
+        [check[column] for check in COORDCHECKS] for column in (4, 5, 6)])
+    spawns = ([], [], [], [])
+    names = []
+    for num, (file, line, action, qid, zone, x, y) in enumerate(COORDCHECKS):
+        if action == 'A':
+            rows = [*get_quest_starters(qid)[:2]]
+        else:
+            rows = [*get_quest_enders(qid)]
+        for se in (se for kind in rows for se in kind):
+            if all(v is not None for v in se[1:4]):
+                for column, value in zip(spawns, (num, *se[1:4])):
+                    column.append(value)
+                names.append(se[0])
+    distances, nearest = geometry.nearest_spawns(positions, spawns)
+
+    # report M tags far away from or not on the map of their spawns,
+    # quests without spawns are already reported by the updates
+    owners = set(spawns[0])
+    failed = 0
+    for num, (file, line, action, qid, zone, x, y) in enumerate(COORDCHECKS):
+        what = 'quest starter' if action == 'A' else 'quest ender'
+        where = '%s:%d: QID %d M %.2f,%.2f|Z|%s' % (
+            file, line, qid, x, y, zone)
+        if num not in owners:
+            continue
+        elif positions[0][num] < 0:
+            print('%s is in an unknown zone' % where, file=sys.stderr)
+        elif nearest[num] < 0:
+            print('%s is not on the map of any %s' % (where, what),
+                  file=sys.stderr)
+        elif distances[num] > tolerance:
+            print('%s is %.1f yards from %s %s' % (
+                where, distances[num], what, names[nearest[num]]),
+                file=sys.stderr)
+        else:
+            continue
+        failed += 1
+    print('%d M tags checked, %d not within %.0f yards of their quest '
+          'starter or ender' % (len(COORDCHECKS), failed, tolerance),
+          file=sys.stderr)
 
 
 def update_parsed_entry(parsed, key, val):
@@ -762,7 +969,7 @@ def generate_tourguide(parsed):
 def process_tourguide(guidestring):
     """ process a single line in the TourGuide format """
     global CURRENTLINE, LASTLINEEMPTY, NOTE_COORD_RE
-    global QID_STARTED, QID_COMPLETED
+    global QID_STARTED, QID_COMPLETED, STEPCOUNT
 
     # split line into arguments, remove whitespaces and reverse for easy pop()
     inlist = [x.strip().rstrip() for x in guidestring.split('|')]
@@ -819,6 +1026,10 @@ def process_tourguide(guidestring):
     if 'Z' not in parsed and CURRENTZONE != STARTZONE:
         parsed['Z'] = CURRENTZONE
 
+    # try to find the QID of quest steps without one
+    if 'QID' not in parsed and parsed['ACTION'] in ('A', 'C', 'T', 't'):
+        update_qid_from_title(parsed)
+
     # check if the QID is in the set of valid quest ids
     qid = None
     if 'QID' in parsed:
@@ -853,23 +1064,30 @@ def process_tourguide(guidestring):
             except ValueError:
                 pass
 
+    # remember M tags as written in the guide to check them later
+    if COORDCHECKS is not None:
+        record_coords(parsed)
+
     # if we update from database information depends on action type
-    if DBC is not None:
+    if DBC is not None or SPAWNS is not None:
         func = 'dbupdate_' + parsed['ACTION']
         if func in globals():
             func = globals()[func]
             func(parsed)
 
     # record qid in sets
+    STEPCOUNT += 1
     if qid is not None:
         if parsed['ACTION'] == 'A':
             if qid not in QID_STARTED:
                 QID_STARTED.append(qid)
+                QID_STARTED_AT[qid] = (STEPCOUNT, CURRENTFILE, CURRENTLINE)
             else:
                 error('QID %d already started in guide' % qid)
         elif parsed['ACTION'] == 'T' or parsed['ACTION'] == 't':
             if qid not in QID_COMPLETED:
                 QID_COMPLETED.append(qid)
+                QID_COMPLETED_AT[qid] = (STEPCOUNT, CURRENTFILE, CURRENTLINE)
             else:
                 error('QID %d already completed in guide' % qid)
 
@@ -969,6 +1187,68 @@ def process_line(inputstring):
                       guidenote=False)
 
 
+def process_guide(name, lines, first=True, last=True):
+    """ process lines of a guide file, a file processed in several blocks
+    of lines is started by the first and ended by the last block """
+    global CURRENTFILE, CURRENTLINE, PROCESS, line
+
+    if first:
+        CURRENTFILE = name
+        CURRENTLINE = 0
+        print('--- %s ---' % CURRENTFILE, file=sys.stderr)
+    for line in lines:
+        process_line(line)
+    if last:
+        PROCESS = False
+
+
+async def process_guides_async(guides, opts):
+    """ process guide files in blocks of lines while the lookups of later
+    blocks are in flight """
+    runner = dbbackend.AsyncQueryRunner(
+        opts.backend, opts.dbname, opts.dbuser, opts.dbpass, opts.window,
+        DBSTATS)
+    try:
+        await runner.open()
+    except dbbackend.DatabaseError as de:
+        print("ERROR: Could not connect to database %s" % opts.dbname,
+              '       %s' % de, sep='\n', file=sys.stderr)
+        sys.exit(1)
+
+    # split files into growing blocks of lines, so the first lines are
+    # processed early and later blocks need few queries, quests are only
+    # looked up for the first block they appear in
+    blocks = []
+    seen = (set(), set(), set())
+    size = PIPELINE_LINES
+    for name, lines in guides:
+        start = 0
+        while start == 0 or start < len(lines):
+            block = lines[start:start + size]
+            wanted = [found - done for found, done in
+                      zip(collect_qids(block), seen)]
+            for found, done in zip(wanted, seen):
+                done.update(found)
+            blocks.append((name, block, start == 0,
+                           start + size >= len(lines), wanted))
+            start += size
+            size = min(size * 2, PIPELINE_MAX)
+
+    # start lookups of all blocks, the runner limits the queries in flight
+    lookups = [asyncio.ensure_future(prefetch_async(*wanted, runner))
+               for name, block, first, last, wanted in blocks]
+
+    # blocks are processed in order in a worker thread, so the event loop
+    # keeps running the lookups of later blocks while a block is parsed
+    # and the output stays in the order of the guides
+    loop = asyncio.get_running_loop()
+    for (name, block, first, last, wanted), lookup in zip(blocks, lookups):
+        await lookup
+        await loop.run_in_executor(
+            None, process_guide, name, block, first, last)
+    await runner.close()
+
+
 def print_quest_list(qids, stream=sys.stdout):
     for qid in sorted(qids):
         quest = get_quest_info(qid)
@@ -1011,35 +1291,33 @@ def print_quest_tracking():
 
     # populate quest lists
     if DBC is not None:
-        # query database for earch QID_AREA entry
-        for area in QID_AREAS.keys():
-            num = DBC.execute(
-                """SELECT qt.id
-                FROM quest_template as qt
-                    INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID
-                WHERE qt.QuestSortID = %s
-                    AND
-                        (%s = 0 OR qt.AllowableRaces = 0 
-                            OR qt.AllowableRaces & %s)
-                    AND
-                        (%s = 0 OR qa.AllowableClasses = 0
-                            OR qa.AllowableClasses & %s)""",
-                (area, QID_RACES, QID_RACES, QID_CLASSES, QID_CLASSES))
-            if num == 0:
-                continue
-            for res in DBC.fetchall():
-                QID_AREAS[area].add(res[0])
+        # query database for all QID_AREA entries at once
+        areas = list(QID_AREAS.keys())
+        DBC.execute(
+            """SELECT qt.QuestSortID, qt.id
+            FROM quest_template as qt
+                INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID
+            WHERE qt.QuestSortID IN (%s)
+                AND
+                    (%%s = 0 OR qt.AllowableRaces = 0
+                        OR qt.AllowableRaces & %%s)
+                AND
+                    (%%s = 0 OR qa.AllowableClasses = 0
+                        OR qa.AllowableClasses & %%s)""" % (
+                ','.join(['%s'] * len(areas))),
+            (*areas, QID_RACES, QID_RACES, QID_CLASSES, QID_CLASSES))
+        for res in DBC.fetchall():
+            QID_AREAS[res[0]].add(res[1])
+
+        # fetch information of all reported quests at once
+        prefetch_quest_info(set().union(*QID_AREAS.values()))
     else:
-        # look in QUESTS database for each quest in QID_AREAS
-        for qid, quest in QUESTS.items():
-            sort = quest['sort']
-            if sort in QID_AREAS:
-                # implement race filter if enabled
-                if QID_RACES != 0 and \
-                        quest['reqs'][0] != 0 and \
-                        quest['reqs'][0] & QID_RACES == 0:
-                   continue
-                QID_AREAS[sort].add(qid)
+        # look in QUESTS database for quests in QID_AREAS with a single
+        # pass or index lookup, race and class filtered
+        found = questdb.find_by_sort(
+            QUESTS, QID_AREAS, QID_RACES, QID_CLASSES)
+        for area, qids in found.items():
+            QID_AREAS[area].update(qids)
 
     # process earch area
     for area, allquests in QID_AREAS.items():
@@ -1050,63 +1328,253 @@ def print_quest_tracking():
             print_quest_list(diff, stream=sys.stderr)
 
 
+def print_quest_chains():
+    """ print report of quests accepted out of quest chain order """
+
+    # in database mode only quests already queried are in the graph,
+    # quests not found in the database are cached as None
+    if DBC is None:
+        graph = questgraph.QuestGraph(QUESTS)
+    else:
+        graph = questgraph.QuestGraph({
+            qid: quest for qid, quest in QUESTS_CACHE.items()
+            if quest is not None})
+    completed = graph.bitset(QID_COMPLETED_AT)
+
+    for qid, (step, file, line) in sorted(
+            QID_STARTED_AT.items(), key=lambda item: item[1][0]):
+        # prerequisites which are turned in only later in the guide,
+        # a quest that only has to be active may still be turned in later
+        active = {-prev for prev in graph.requires.get(qid, ()) if prev < 0}
+        for prev in graph.decode(graph.closure(qid) & completed):
+            if QID_COMPLETED_AT[prev][0] > step and prev not in active:
+                print('%s:%d: QID %d accepted before prerequisite QID %d is '
+                      'turned in' % (file, line, qid, prev), file=sys.stderr)
+
+        # only one quest of a positive exclusive group can be done
+        if graph.group.get(qid, 0) > 0:
+            for other in graph.exclusive(qid):
+                if other in QID_STARTED_AT and QID_STARTED_AT[other][0] < step:
+                    print('%s:%d: QID %d is exclusive with already accepted '
+                          'QID %d' % (file, line, qid, other), file=sys.stderr)
+
+
 def get_quest_info(qid):
     """ get quest information, either from database or static import """
     global DBC
 
+    # QIDs which could not be parsed are never looked up
+    if not isinstance(qid, int):
+        return None
+
     # static import
     if DBC is None:
-        global QUESTS
-        if qid in QUESTS:
-            return QUESTS[qid]
-        else:
-            return None
-
-    # use cache of quest information from the database
-    global QUESTS_CACHE
-    if 'QUESTS_CACHE' not in globals():
-        QUESTS_CACHE = {}
-    if qid in QUESTS_CACHE:
-        return QUESTS_CACHE[qid]
-
-    # retrieve information from database
-    num = DBC.execute("""
-        SELECT
-            qt.ID,
-            qt.LogTitle,
-            qt.QuestLevel,
-            qt.MinLevel,
-            qa.MaxLevel,
-            qt.QuestSortID,
-            qt.QuestInfoID,
-            qa.PrevQuestID,
-            qa.NextQuestID,
-            qa.ExclusiveGroup,
-            qt.RewardNextQuest,
-            qt.RewardXPDifficulty,
-            qt.AllowableRaces,
-            qa.AllowableClasses
-        FROM quest_template AS qt
-        INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID
-        WHERE qt.ID = %s""", (qid,))
-    if num != 1:
-        return None
-    entry = DBC.fetchone()
-    QUESTS_CACHE[qid] = {
-            'name': entry[1],
-            'sort': entry[5],
-            'info': entry[6],
-            'lvls': (entry[2], entry[3], entry[4]),
-            'link': (entry[7], entry[8], entry[9], entry[10]),
-            'reqs': (entry[12], entry[13]),
-            'diff': entry[11]
-        }
+        return QUESTS.get(qid)
+
+    # retrieve information from cache or database
+    if qid not in QUESTS_CACHE:
+        prefetch_quest_info([qid])
     return QUESTS_CACHE[qid]
 
 
+def quest_from_row(entry):
+    """ convert a row of QUEST_QUERY into a quest dict """
+    return {
+        'name': entry[1],
+        'sort': entry[5],
+        'info': entry[6],
+        'lvls': (entry[2], entry[3], entry[4]),
+        'link': (entry[7], entry[8], entry[9], entry[10]),
+        'reqs': (entry[12], entry[13]),
+        'diff': entry[11]
+    }
+
+
+def prefetch(lines):
+    """ fetch quest information, starters and enders for steps in lines """
+    qids, starters, enders = collect_qids(lines)
+    prefetch_quest_info(qids)
+    prefetch_quest_locations(starters, enders)
+
+
+async def prefetch_async(qids, starters, enders, runner):
+    """ fetch quest information, starters and enders collected from the
+    steps of a guide with the queries running on an AsyncQueryRunner """
+    await asyncio.gather(
+        run_lookup_async(lookup_quest_info(qids), runner),
+        run_lookup_async(lookup_quest_locations(starters, enders), runner))
+
+
+def collect_qids(lines):
+    """ get quest ids and those to look up starters and enders for """
+
+    # collect quest ids of QID, ACTIVE and AVAILABLE tags,
+    # starters are looked up for A steps and enders for T steps
+    qids = set()
+    starters = set()
+    enders = set()
+    for line in lines:
+        action = line.lstrip()[:1]
+        for tag, value in QID_TAGS_RE.findall(line):
+            tagqids = [int(qid) for qid in re.findall(r'\d+', value)]
+            qids.update(tagqids)
+            if action == 'A' and tag.upper() in ('QID', 'AVAILABLE'):
+                starters.update(tagqids)
+            elif action == 'T' and tag.upper() == 'QID':
+                enders.update(tagqids)
+    return qids, starters, enders
+
+
+def run_lookup(lookup):
+    """ run a lookup generator, it yields lists of (query, args) pairs and
+    is sent the rows of each query in the same order """
+    try:
+        queries = next(lookup)
+        while True:
+            queries = lookup.send(run_queries(queries))
+    except StopIteration:
+        pass
+
+
+async def run_lookup_async(lookup, runner):
+    """ run a lookup generator with the queries on an AsyncQueryRunner """
+    try:
+        queries = next(lookup)
+        while True:
+            rows = await asyncio.gather(
+                *[runner.query(query, args) for query, args in queries])
+            queries = lookup.send(list(rows))
+    except StopIteration:
+        pass
+
+
+def prefetch_quest_info(qids):
+    """ fill QUESTS_CACHE for quest ids with chunked queries """
+    run_lookup(lookup_quest_info(qids))
+
+
+def lookup_quest_info(qids):
+    """ lookup generator filling QUESTS_CACHE, see run_lookup() """
+    qids = sorted(set(qids).difference(QUESTS_CACHE))
+    if DBCACHE is not None:
+        QUESTS_CACHE.update(DBCACHE.get('quest', qids))
+        qids = [qid for qid in qids if qid not in QUESTS_CACHE]
+
+    # quests not found in the database are cached as unknown
+    fetched = {qid: None for qid in qids}
+    query = QUEST_QUERY + " WHERE qt.ID IN (%s)"
+    for rows in (yield [(query % ','.join(['%s'] * len(chunk)), chunk)
+                        for chunk in chunk_qids(qids)]):
+        for entry in rows:
+            fetched[entry[0]] = quest_from_row(entry)
+
+    QUESTS_CACHE.update(fetched)
+    if DBCACHE is not None:
+        DBCACHE.put('quest', fetched)
+
+
+def chunk_qids(qids):
+    """ split quest ids into chunks, at least one for each database worker """
+    size = PREFETCH_CHUNK
+    if DBPOOL is not None:
+        size = max(1, min(size, -(-len(qids) // DBPOOL.size)))
+    return [qids[start:start + size] for start in range(0, len(qids), size)]
+
+
+def run_queries(queries):
+    """ run (query, args) pairs, on the worker pool if there is one,
+    and return the rows of each query in the same order """
+    if DBPOOL is not None:
+        return DBPOOL.map(queries)
+    results = []
+    for query, args in queries:
+        DBC.execute(query, args)
+        results.append(DBC.fetchall())
+    return results
+
+
+def query_by_qid(*jobs):
+    """ lookup generator running (query, qids) jobs for chunks of quest ids
+    at once and returning the rows of each job grouped by quest id """
+    queries = []
+    for query, qids in jobs:
+        for chunk in chunk_qids(qids):
+            queries.append((query % ','.join(['%s'] * len(chunk)), chunk))
+    rows = iter((yield queries))
+
+    results = []
+    for query, qids in jobs:
+        result = {qid: [] for qid in qids}
+        for chunk in chunk_qids(qids):
+            for entry in next(rows):
+                result[entry[0]].append(entry[1:])
+        results.append(result)
+    return results
+
+
+def prefetch_quest_locations(starters, enders):
+    """ fill QUEST_STARTERS and QUEST_ENDERS with set based queries """
+    run_lookup(lookup_quest_locations(starters, enders))
+
+
+def lookup_quest_locations(starters, enders):
+    """ lookup generator filling QUEST_STARTERS and QUEST_ENDERS,
+    see run_lookup() """
+
+    # gameobjects and items are only needed when no creature is found,
+    # just like dbupdate_A and dbupdate_T use them
+    starters = sorted(set(starters).difference(QUEST_STARTERS))
+    enders = sorted(set(enders).difference(QUEST_ENDERS))
+    if DBCACHE is not None:
+        QUEST_STARTERS.update(DBCACHE.get('starters', starters))
+        starters = [qid for qid in starters if qid not in QUEST_STARTERS]
+        QUEST_ENDERS.update(DBCACHE.get('enders', enders))
+        enders = [qid for qid in enders if qid not in QUEST_ENDERS]
+
+    # starters and enders of the same kind are queried at once
+    creatures, endcreatures = yield from query_by_qid(
+        (STARTER_CREATURE_QUERY, starters), (ENDER_CREATURE_QUERY, enders))
+    missing = [qid for qid in starters if not creatures[qid]]
+    endmissing = [qid for qid in enders if not endcreatures[qid]]
+    gameobjects, endgameobjects = yield from query_by_qid(
+        (STARTER_GAMEOBJECT_QUERY, missing),
+        (ENDER_GAMEOBJECT_QUERY, endmissing))
+    missing = [qid for qid in missing if not gameobjects[qid]]
+    items, = yield from query_by_qid((STARTER_ITEM_QUERY, missing))
+
+    for qid in starters:
+        QUEST_STARTERS[qid] = (creatures[qid], gameobjects.get(qid, []),
+                               items.get(qid, []))
+    for qid in enders:
+        QUEST_ENDERS[qid] = (endcreatures[qid], endgameobjects.get(qid, []))
+    if DBCACHE is not None:
+        DBCACHE.put('starters', {qid: QUEST_STARTERS[qid] for qid in starters})
+        DBCACHE.put('enders', {qid: QUEST_ENDERS[qid] for qid in enders})
+
+
+def get_quest_starters(qid):
+    """ get creatures, gameobjects and items starting a quest """
+    if qid not in QUEST_STARTERS:
+        if DBC is None:
+            QUEST_STARTERS[qid] = SPAWNS.starters(qid)
+        else:
+            prefetch_quest_locations([qid], [])
+    return QUEST_STARTERS[qid]
+
+
+def get_quest_enders(qid):
+    """ get creatures and gameobjects ending a quest """
+    if qid not in QUEST_ENDERS:
+        if DBC is None:
+            QUEST_ENDERS[qid] = SPAWNS.enders(qid)
+        else:
+            prefetch_quest_locations([], [qid])
+    return QUEST_ENDERS[qid]
+
+
 def parse_args():
     """ parse command line arguments """
-    global QID_RACES, QID_CLASSES
+    global QID_RACES, QID_CLASSES, DBSTATS
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -1120,21 +1588,87 @@ def parse_args():
     parser.add_argument(
         '-H', '--horde', dest='horde', action='store_true',
         help='Filter quests to available for Horde')
+    parser.add_argument(
+        '-c', '--chains', dest='chains', action='store_true',
+        help='Check order of quest chains in guide')
+    parser.add_argument(
+        '--insert-qids', dest='insertqids', action='store_true',
+        help='Insert QIDs of steps without one found by their title, '
+             'otherwise they are only suggested')
+    parser.add_argument(
+        '--check-coords', dest='checkcoords', action='store_true',
+        help='Check M tags of A and T steps against the spawns of their '
+             'quest starter or ender, needs database or spawn snapshot')
+    parser.add_argument(
+        '--coord-tolerance', dest='coordtolerance', metavar='YARDS',
+        type=float, default=30.0,
+        help='Distance of M tags to spawns reported by --check-coords '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '-q', '--questdb', dest='questdb', metavar='FILE',
+        help='Read quests from binary snapshot or SQLite quest store')
+    parser.add_argument(
+        '--packed-quests', dest='packedquests', action='store_true',
+        help='Keep quests of a binary snapshot as packed columns, for runs '
+             'reading most of the quests')
+    parser.add_argument(
+        '--spawndb', dest='spawndb', metavar='FILE',
+        help='Update steps from spawn snapshot without database')
+    parser.add_argument(
+        '--areagrid', dest='areagrid', metavar='FILE',
+        help='Resolve zones of positions with precomputed area grid')
+    parser.add_argument(
+        '-x', '--expansion', dest='expansion', metavar='EXPANSION',
+        help='Variant of quest and area information, a variant of the '
+             'binary snapshot with -q (default: base variant of the snapshot '
+             'or %s)' % DEFAULT_EXPANSION)
 
     # database connection
     database = parser.add_argument_group('database')
     database.add_argument(
         '-d', '--database', dest='database', action='store_true',
-        help='Enable querying AzerothCore style MySQL database')
+        help='Enable querying AzerothCore style world database')
     database.add_argument(
         '--dbname', dest='dbname', metavar='DATABASE', default='acore_world',
         help='Name of database (default: %(default)s)')
+    database.add_argument(
+        '--backend', dest='backend', choices=dbbackend.BACKENDS,
+        default='mysql',
+        help='Database backend, the SQLite database is read from the file '
+             'DATABASE.sqlite (default: %(default)s)')
     database.add_argument(
         '-u', '--dbuser', dest='dbuser', metavar='USERNAME', default='reader',
         help='User for database access (default: %(default)s)')
     database.add_argument(
         '-p', '--dbpass', dest='dbpass', metavar='PASSWORD', default='reader',
         help='Password for database access (default: %(default)s)')
+    database.add_argument(
+        '--db-stats', dest='dbstats', action='store_true',
+        help='Print calls, rows and latency of each query at exit')
+    database.add_argument(
+        '--slow-query', dest='slowquery', metavar='MS', type=float,
+        help='Log queries taking at least MS milliseconds')
+    database.add_argument(
+        '-j', '--jobs', dest='jobs', metavar='NUM', type=int, default=1,
+        help='Number of database connections used for prefetching '
+             '(default: %(default)s)')
+    database.add_argument(
+        '--async', dest='asyncio', action='store_true',
+        help='Look up later files while processing earlier ones')
+    database.add_argument(
+        '--window', dest='window', metavar='NUM', type=int, default=32,
+        help='Maximum number of queries in flight in asyncio mode '
+             '(default: %(default)s)')
+    database.add_argument(
+        '--cache-dir', dest='cachedir', metavar='DIR',
+        help='Keep database lookups in a persistent cache in DIR')
+    database.add_argument(
+        '--cache-size', dest='cachesize', metavar='NUM', type=int,
+        default=dbcache.CACHE_SIZE,
+        help='Maximum number of cached lookups (default: %(default)s)')
+    database.add_argument(
+        '--refresh-cache', dest='refreshcache', action='store_true',
+        help='Drop all cached lookups of the database before use')
     opts = parser.parse_args()
 
     # check alliance/horde filters
@@ -1142,6 +1676,9 @@ def parse_args():
         print("ERROR: Can't filter by Alliance and Horde at the same time.",
               file=sys.stderr)
         sys.exit(1)
+    if opts.insertqids:
+        global INSERTQIDS
+        INSERTQIDS = True
     if opts.alliance:
         QID_RACES = RACES_ALLIANCE
     if opts.horde:
@@ -1149,39 +1686,130 @@ def parse_args():
 
     # establish database connection?
     if opts.database:
-        # import MySQL module
-        try:
-            import MySQLdb
-        except ImportError as ie:
-            print("ERROR: Database querying enabled but can't import MySQLdb",
-                  '       %s' % repr(ie), sep='\n', file=sys.stderr)
-            sys.exit(1)
+        # record calls and latency of the queries
+        if opts.dbstats or opts.slowquery is not None:
+            DBSTATS = dbbackend.QueryStats(opts.slowquery)
+            if opts.dbstats:
+                atexit.register(DBSTATS.print_summary)
+
         try:
-            dbconnection = MySQLdb.connect(
-                db=opts.dbname, user=opts.dbuser, passwd=opts.dbpass)
-        except MySQLdb.OperationalError as oe:
+            dbconnection = dbbackend.connect(
+                opts.backend, opts.dbname, opts.dbuser, opts.dbpass, DBSTATS)
+        except dbbackend.DatabaseError as de:
             print("ERROR: Could not connect to database %s" % opts.dbname,
-                  '       %s' % repr(oe), sep='\n', file=sys.stderr)
+                  '       %s' % de, sep='\n', file=sys.stderr)
             sys.exit(1)
 
         # create a cursor to use for database connections
         global DBC
         DBC = dbconnection.cursor()
-    else:
-        # TODO: make this pre- and post-Cataclysm dependant
+
+        # open additional connections for concurrent prefetching
+        if opts.jobs > 1:
+            global DBPOOL
+            try:
+                DBPOOL = dbbackend.CursorPool(
+                    opts.backend, opts.dbname, opts.dbuser, opts.dbpass,
+                    opts.jobs, DBSTATS)
+            except dbbackend.DatabaseError as de:
+                print("ERROR: Could not connect to database %s" % opts.dbname,
+                      '       %s' % de, sep='\n', file=sys.stderr)
+                sys.exit(1)
+
+        # open persistent cache of lookups for this state of the database
+        if opts.cachedir:
+            global DBCACHE
+            try:
+                DBCACHE = dbcache.LookupCache(
+                    opts.cachedir, opts.dbname, dbcache.fingerprint(DBC),
+                    opts.cachesize, opts.refreshcache)
+            except (OSError, sqlite3.Error) as err:
+                print("ERROR: Could not open lookup cache in %s" %
+                      opts.cachedir, '       %s' % repr(err), sep='\n',
+                      file=sys.stderr)
+                sys.exit(1)
+
+            # lookups are written back even if processing fails
+            atexit.register(DBCACHE.close)
+    elif opts.questdb:
+        # open binary quest snapshot or SQLite quest store
         global QUESTS
         try:
-            from filter_questdb_pre import QUESTS
+            QUESTS = questdb.load(
+                opts.questdb, opts.expansion, opts.packedquests)
+        except (OSError, ValueError) as err:
+            print("ERROR: Could not read quest snapshot %s" % opts.questdb,
+                  '       %s' % repr(err), sep='\n', file=sys.stderr)
+            sys.exit(1)
+    else:
+        module = 'filter_questdb_%s' % (opts.expansion or DEFAULT_EXPANSION)
+        try:
+            QUESTS = importlib.import_module(module).QUESTS
         except ImportError:
-            print("ERROR: Could not read questdb_pre.py", file=sys.stderr)
+            print("ERROR: Could not read %s.py" % module, file=sys.stderr)
+            sys.exit(1)
+        del sys.modules[module]
+
+    # only quests of binary snapshots are packed into a QuestTable
+    if opts.packedquests and not isinstance(QUESTS, questdb.QuestTable):
+        print("WARNING: --packed-quests has no effect without a binary "
+              "quest snapshot", file=sys.stderr)
+
+    # open spawn snapshot for updates without database
+    if opts.spawndb and not opts.database:
+        global SPAWNS
+        try:
+            SPAWNS = spawndb.SpawnSnapshot(opts.spawndb)
+        except (OSError, ValueError) as err:
+            print("ERROR: Could not read spawn snapshot %s" % opts.spawndb,
+                  '       %s' % repr(err), sep='\n', file=sys.stderr)
             sys.exit(1)
 
-    # import information
-    # TODO: make this pre- and post-Cataclysm dependant
+    # M tags are checked against spawns from the database or snapshot
+    if opts.checkcoords:
+        if DBC is None and SPAWNS is None:
+            print("ERROR: Checking coordinates needs a database or spawn "
+                  "snapshot", file=sys.stderr)
+            sys.exit(1)
+        global COORDCHECKS
+        COORDCHECKS = []
+
+    # import information stored in the quest snapshot, else from the
+    # module of the expansion or of the base variant of the snapshot
     global QUESTXP, AREAS, AREATABLE
-    from filter_info_pre import QUESTXP
-    from filter_info_pre import AREAS
-    from filter_info_pre import AREATABLE
+    info, base = None, None
+    if opts.questdb and not opts.database:
+        info, base = questdb.load_info(opts.questdb, opts.expansion)
+    if info is None:
+        modules = ['filter_info_%s' % (
+            opts.expansion or base or DEFAULT_EXPANSION)]
+        if base is not None:
+            modules.append('filter_info_%s' % base)
+        for module in modules:
+            try:
+                module = importlib.import_module(module)
+                break
+            except ImportError:
+                pass
+        else:
+            print("ERROR: Could not read %s.py" % modules[0], file=sys.stderr)
+            sys.exit(1)
+        if module.__name__ != modules[0]:
+            print("WARNING: Could not read %s.py, using areas and XP of "
+                  "%s.py" % (modules[0], module.__name__), file=sys.stderr)
+        info = {key: getattr(module, key) for key in questdb.INFO_KEYS}
+    QUESTXP = info['QUESTXP']
+    AREAS = info['AREAS']
+    AREATABLE = info['AREATABLE']
+
+    # compile AREAS for coordinate conversion, with area grid if given
+    global AREACOORDS
+    try:
+        AREACOORDS = geometry.AreaTable(AREAS, opts.areagrid)
+    except (OSError, ValueError) as err:
+        print("ERROR: Could not read area grid %s" % opts.areagrid,
+              '       %s' % repr(err), sep='\n', file=sys.stderr)
+        sys.exit(1)
 
     # if a quest log header is set check if it is known in the AREATABLE
     if opts.header:
@@ -1212,14 +1840,18 @@ if __name__ == '__main__':
     # parse command line arguments
     options = parse_args()
 
-    # read each file from command line
-    for file in options.file:
-        CURRENTFILE = file.name
-        CURRENTLINE = 0
-        print('--- %s ---' % CURRENTFILE, file=sys.stderr)
-        for line in file:
-            process_line(line)
-        PROCESS = False
+    # read all files from command line
+    guides = [(file.name, file.readlines()) for file in options.file]
+
+    # process each file, in asyncio mode while later files are looked up
+    if options.asyncio and DBC is not None:
+        asyncio.run(process_guides_async(guides, options))
+    else:
+        # fetch information on all quests in the guides at once
+        if DBC is not None:
+            prefetch(line for name, lines in guides for line in lines)
+        for name, lines in guides:
+            process_guide(name, lines)
 
     if not FIRSTHEADER:
         print(']]', 'end)', sep='\n')
@@ -1228,6 +1860,18 @@ if __name__ == '__main__':
     print('%d quests started, %d quests completed' % (
         len(QID_STARTED), len(QID_COMPLETED)), file=sys.stderr)
 
+    # check order of quest chains
+    if options.chains:
+        print_quest_chains()
+
+    # check M tags against the spawns of their quests
+    if COORDCHECKS is not None:
+        check_coords(options.coordtolerance)
+
     # check QIDs in quest db
     if options.header:
         print_quest_tracking()
+
+    # close database connections, the lookup cache is closed at exit
+    if DBPOOL is not None:
+        DBPOOL.close()
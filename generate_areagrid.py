@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import importlib
+import geometry
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Precompute the candidate zones of the AREAS on a grid '
+                    'for resolving the zones of positions')
+    parser.add_argument(
+        '-x', '--expansion', dest='expansion', metavar='EXPANSION',
+        default='pre',
+        help='Variant of area information (default: %(default)s)')
+    parser.add_argument(
+        '--cells', dest='cells', metavar='NUM', type=int,
+        default=geometry.GRID_CELLS,
+        help='Number of cells along the longer side of each map '
+             '(default: %(default)s)')
+
+    # command line arguments for output
+    output = parser.add_argument_group('output')
+    output.add_argument(
+        '-o', '--output', dest='output', metavar='FILE', required=True,
+        help='Write area grid to file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    options = parse_args()
+
+    # import area information
+    try:
+        info = importlib.import_module('filter_info_%s' % options.expansion)
+    except ImportError:
+        print("ERROR: Could not read filter_info_%s.py" % options.expansion,
+              file=sys.stderr)
+        sys.exit(1)
+
+    # build grid and write it
+    with open(options.output, 'wb') as outfile:
+        geometry.write_grid(outfile, info.AREAS, options.cells)
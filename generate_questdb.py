@@ -2,26 +2,53 @@
 import re
 import sys
 import math
+import zlib
+import atexit
 import pprint
-import MySQLdb
 import argparse
+import importlib
+import dbbackend
+import questdb
 
 # prettyprinter
 PP = pprint.PrettyPrinter(indent=4)
 
-# database connection cursor for querying information
+# database connection and cursor for querying information
+DB = None
 DBC = None
 
+# calls and latency of the database queries
+DBSTATS = None
+
 # QUESTS from Quest Database
 QUESTS = {}
 
+# query for all quests with their addon information
+QUEST_QUERY = """
+    SELECT
+        qt.ID,
+        qt.LogTitle,
+        qt.QuestLevel,
+        qt.MinLevel,
+        qa.MaxLevel,
+        qt.QuestSortID,
+        qt.QuestInfoID,
+        qa.PrevQuestID,
+        qa.NextQuestID,
+        qa.ExclusiveGroup,
+        qt.RewardNextQuest,
+        qt.RewardXPDifficulty,
+        qt.AllowableRaces,
+        qa.AllowableClasses
+    FROM quest_template AS qt
+    INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID"""
 
-def read_quests():
-    global DBC, QUESTS
-
-    num = DBC.execute("""
-        SELECT
-            qt.ID,
+# query for a checksum of each quest, the columns are in the same order as
+# in QUEST_QUERY so row_checksum() can calculate it from a quest dict
+CHECKSUM_QUERY = """
+    SELECT
+        qt.ID,
+        CRC32(CONCAT_WS('|',
             qt.LogTitle,
             qt.QuestLevel,
             qt.MinLevel,
@@ -34,26 +61,176 @@ def read_quests():
             qt.RewardNextQuest,
             qt.RewardXPDifficulty,
             qt.AllowableRaces,
-            qa.AllowableClasses
-        FROM quest_template AS qt
-        INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID""")
+            qa.AllowableClasses))
+    FROM quest_template AS qt
+    INNER JOIN quest_template_addon AS qa ON qt.ID = qa.ID"""
+
+# number of quests fetched with a single query in incremental mode
+FETCH_CHUNK = 500
+
+
+class ModuleWriter:
+    """ incrementally write quests formatted like PP.pformat(QUESTS) """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._count = 0
+
+    def add(self, qid, quest):
+        # pretty print a single entry dict and strip its braces, the
+        # indentation matches the entry in the pretty printed full dict
+        entry = PP.pformat({qid: quest})[1:-1]
+        if self._count == 0:
+            self._stream.write("QUESTS = {" + entry)
+        else:
+            self._stream.write(",\n " + entry)
+        self._count += 1
+
+    def close(self):
+        if self._count == 0:
+            self._stream.write("QUESTS = {")
+        self._stream.write("}\n")
+
+
+def quest_from_row(entry):
+    """ convert a row of QUEST_QUERY into a quest dict """
+    return {
+        'name': entry[1],
+        'sort': entry[5],
+        'info': entry[6],
+        'lvls': (entry[2], entry[3], entry[4]),
+        'link': (entry[7], entry[8], entry[9], entry[10]),
+        'reqs': (entry[12], entry[13]),
+        'diff': entry[11]
+    }
+
+
+def row_from_quest(qid, quest):
+    """ convert a quest dict back into a row of QUEST_QUERY """
+    return (qid, quest['name'], *quest['lvls'], quest['sort'], quest['info'],
+            *quest['link'], quest['diff'], *quest['reqs'])
+
+
+def row_checksum(row):
+    """ calculate the checksum CHECKSUM_QUERY returns for a row """
+    # CONCAT_WS skips NULL values
+    values = [str(value) for value in row[1:] if value is not None]
+    return zlib.crc32('|'.join(values).encode('utf-8'))
+
+
+def read_quests():
+    global DBC, QUESTS
+
+    num = DBC.execute(QUEST_QUERY)
     if num <= 1:
         print("ERROR: No results while querying quests", file=sys.stderr)
         sys.exit(1)
     for entry in DBC.fetchall():
-        QUESTS[entry[0]] = {
-            'name': entry[1],
-            'sort': entry[5],
-            'info': entry[6],
-            'lvls': (entry[2], entry[3], entry[4]),
-            'link': (entry[7], entry[8], entry[9], entry[10]),
-            'reqs': (entry[12], entry[13]),
-            'diff': entry[11]
-        }
+        QUESTS[entry[0]] = quest_from_row(entry)
+
+
+def update_quests(path):
+    """ update quests of an existing snapshot with changed database rows """
+    global DBC, QUESTS
+
+    # read existing snapshot
+    try:
+        QUESTS = dict(questdb.load(path).items())
+    except (OSError, ValueError) as err:
+        print("ERROR: Could not read quest snapshot %s" % path,
+              '       %s' % repr(err), sep='\n', file=sys.stderr)
+        sys.exit(1)
+
+    # compare checksums calculated by the database to the snapshot
+    num = DBC.execute(CHECKSUM_QUERY)
+    if num <= 1:
+        print("ERROR: No results while querying quests", file=sys.stderr)
+        sys.exit(1)
+    checksums = dict(DBC.fetchall())
+    removed = sorted(set(QUESTS) - set(checksums))
+    added = sorted(set(checksums) - set(QUESTS))
+    changed = sorted(
+        qid for qid, checksum in checksums.items() if qid in QUESTS and
+        row_checksum(row_from_quest(qid, QUESTS[qid])) != checksum)
+
+    # fetch only new and changed quests
+    for qid in removed:
+        del QUESTS[qid]
+    fetch = added + changed
+    for start in range(0, len(fetch), FETCH_CHUNK):
+        chunk = fetch[start:start + FETCH_CHUNK]
+        DBC.execute(
+            QUEST_QUERY + " WHERE qt.ID IN (%s)" % ','.join(['%s'] * len(chunk)),
+            chunk)
+        for entry in DBC.fetchall():
+            QUESTS[entry[0]] = quest_from_row(entry)
+
+    # print summary
+    for title, qids in (('Added', added), ('Removed', removed),
+                        ('Changed', changed)):
+        print("%s %d quests" % (title, len(qids)), end='', file=sys.stderr)
+        if qids:
+            print(':', ', '.join(str(qid) for qid in qids), end='',
+                  file=sys.stderr)
+        print(file=sys.stderr)
+
+
+def merge_snapshots(variants, path):
+    """ write snapshots as variants of a single binary snapshot """
+    snapshots = []
+    for variant in variants:
+        name, sep, snapshot = variant.partition('=')
+        if not sep:
+            print("ERROR: Expected VARIANT=SNAPSHOT, got '%s'" % variant,
+                  file=sys.stderr)
+            sys.exit(1)
+        try:
+            snapshots.append((name, dict(questdb.load(snapshot).items())))
+        except (OSError, ValueError) as err:
+            print("ERROR: Could not read quest snapshot %s" % snapshot,
+                  '       %s' % repr(err), sep='\n', file=sys.stderr)
+            sys.exit(1)
+
+    # first snapshot is the base, the others are stored as differences
+    name, base = snapshots[0]
+    with open(path, 'wb') as outfile:
+        writer = questdb.SnapshotWriter(outfile, variant=name)
+        for qid in sorted(base):
+            writer.add(qid, base[qid])
+        for name, quests in snapshots[1:]:
+            writer.add_overlay(name, quests, base)
+
+        # store area information of the variants with a filter_info module
+        for name, quests in snapshots:
+            try:
+                info = importlib.import_module('filter_info_%s' % name)
+            except ImportError:
+                print("No filter_info_%s.py, no area information stored for "
+                      "variant %s" % (name, name), file=sys.stderr)
+                continue
+            writer.add_info(vars(info), name)
+        writer.close()
+
+
+def stream_quests(writer):
+    """ pass quests to writer while they arrive from the database """
+    global DB
+
+    # unbuffered server side cursor, rows are not stored on the client
+    cursor = DB.cursor(stream=True)
+    cursor.execute(QUEST_QUERY + " ORDER BY qt.ID")
+    num = 0
+    for entry in cursor:
+        writer.add(entry[0], quest_from_row(entry))
+        num += 1
+    cursor.close()
+    if num <= 1:
+        print("ERROR: No results while querying quests", file=sys.stderr)
+        sys.exit(1)
 
 
 def parse_args():
-    global DBC
+    global DB, DBC, DBSTATS
     parser = argparse.ArgumentParser()
 
     # command line arguments for database connection
@@ -61,23 +238,86 @@ def parse_args():
     database.add_argument(
         '--dbname', dest='dbname', metavar='DATABASE', default='acore_world',
         help='Name of database (default: %(default)s)')
+    database.add_argument(
+        '--backend', dest='backend', choices=dbbackend.BACKENDS,
+        default='mysql',
+        help='Database backend, the SQLite database is read from the file '
+             'DATABASE.sqlite (default: %(default)s)')
     database.add_argument(
         '-u', '--dbuser', dest='dbuser', metavar='USERNAME', default='reader',
         help='User for database access (default: %(default)s)')
     database.add_argument(
         '-p', '--dbpass', dest='dbpass', metavar='PASSWORD', default='reader',
         help='Password for database access (default: %(default)s)')
+    database.add_argument(
+        '--db-stats', dest='dbstats', action='store_true',
+        help='Print calls, rows and latency of each query at exit')
+    database.add_argument(
+        '--slow-query', dest='slowquery', metavar='MS', type=float,
+        help='Log queries taking at least MS milliseconds')
+
+    # command line arguments for output
+    output = parser.add_argument_group('output')
+    output.add_argument(
+        '-o', '--output', dest='output', metavar='FILE',
+        help='Write quests to file instead of stdout')
+    output.add_argument(
+        '-i', '--incremental', dest='incremental', metavar='SNAPSHOT',
+        help='Only fetch quests that changed compared to existing snapshot')
+    output.add_argument(
+        '-m', '--merge', dest='merge', metavar='VARIANT=SNAPSHOT',
+        action='append',
+        help='Merge snapshots as variants of one binary snapshot, '
+             'the first is the base variant')
+    output.add_argument(
+        '-s', '--stream', dest='stream', action='store_true',
+        help='Write quests while reading them with constant memory use')
+    output.add_argument(
+        '-b', '--binary', dest='binary', action='store_true',
+        help='Write compact binary snapshot instead of python module')
+    output.add_argument(
+        '--sqlite', dest='sqlite', action='store_true',
+        help='Write indexed SQLite quest store instead of python module')
     opts = parser.parse_args()
 
+    # incremental updates need the complete snapshot in memory
+    if opts.incremental and opts.stream:
+        print("ERROR: Incremental update can't be streamed", file=sys.stderr)
+        sys.exit(1)
+
+    # binary snapshots and SQLite stores are not written to the terminal
+    if opts.binary and opts.sqlite:
+        print("ERROR: Choose either binary snapshot or SQLite store",
+              file=sys.stderr)
+        sys.exit(1)
+    if (opts.binary or opts.sqlite) and not opts.output:
+        print("ERROR: Binary snapshot and SQLite store require an output file",
+              file=sys.stderr)
+        sys.exit(1)
+
+    # merging existing snapshots does not need the database
+    if opts.merge:
+        if not opts.output:
+            print("ERROR: Merging snapshots requires an output file",
+                  file=sys.stderr)
+            sys.exit(1)
+        return opts
+
+    # record calls and latency of the queries
+    if opts.dbstats or opts.slowquery is not None:
+        DBSTATS = dbbackend.QueryStats(opts.slowquery)
+        if opts.dbstats:
+            atexit.register(DBSTATS.print_summary)
+
     # open database connection and create the cursor
     try:
-        dbconnection = MySQLdb.connect(
-            db=opts.dbname, user=opts.dbuser, passwd=opts.dbpass)
-    except MySQLdb.OperationalError as oe:
+        DB = dbbackend.connect(
+            opts.backend, opts.dbname, opts.dbuser, opts.dbpass, DBSTATS)
+    except dbbackend.DatabaseError as de:
         print("ERROR: Could not connect to database %s" % opts.dbname,
-              '       %s' % repr(oe), sep='\n', file=sys.stderr)
+              '       %s' % de, sep='\n', file=sys.stderr)
         sys.exit(1)
-    DBC = dbconnection.cursor()
+    DBC = DB.cursor()
 
     # return parsed options
     return opts
@@ -88,9 +328,45 @@ if __name__ == '__main__':
     # parse command line arguments
     options = parse_args()
 
-    # query quest database
-    read_quests()
+    # merge snapshot variants
+    if options.merge:
+        merge_snapshots(options.merge, options.output)
+        sys.exit(0)
 
-    # generate output
-    print("QUESTS =", PP.pformat(QUESTS))
+    # stream quests from database directly into the output
+    if options.stream:
+        outfile = None
+        if options.sqlite:
+            writer = questdb.SqliteWriter(options.output)
+        elif options.binary:
+            outfile = open(options.output, 'wb')
+            writer = questdb.SnapshotWriter(outfile)
+        elif options.output:
+            outfile = open(options.output, 'w')
+            writer = ModuleWriter(outfile)
+        else:
+            outfile = sys.stdout
+            writer = ModuleWriter(outfile)
+        stream_quests(writer)
+        writer.close()
+        if outfile not in (None, sys.stdout):
+            outfile.close()
+        sys.exit(0)
+
+    # query quest database, either completely or only changes
+    if options.incremental:
+        update_quests(options.incremental)
+    else:
+        read_quests()
 
+    # generate output
+    if options.sqlite:
+        questdb.write_sqlite(options.output, QUESTS)
+    elif options.binary:
+        with open(options.output, 'wb') as outfile:
+            questdb.write_snapshot(outfile, QUESTS)
+    elif options.output:
+        with open(options.output, 'w') as outfile:
+            print("QUESTS =", PP.pformat(QUESTS), file=outfile)
+    else:
+        print("QUESTS =", PP.pformat(QUESTS))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import sys
+import atexit
+import argparse
+import dbbackend
+import spawndb
+
+# database connection and cursor for querying information
+DB = None
+DBC = None
+
+# calls and latency of the database queries
+DBSTATS = None
+
+# queries for spawns by kind, the first column is the key followed by a row
+# like the lookups in filter.py return them
+SPAWN_QUERIES = {
+    b'SNPC': """
+        SELECT qt.ID, ct.name, c.map, c.position_x, c.position_y
+        FROM quest_template AS qt
+            INNER JOIN creature_queststarter AS cq ON qt.ID = cq.quest
+            INNER JOIN creature_template AS ct ON cq.id = ct.entry
+            INNER JOIN creature AS c ON cq.id = c.id""",
+    b'SOBJ': """
+        SELECT qt.ID, gt.name, g.map, g.position_x, g.position_y
+        FROM quest_template AS qt
+            INNER JOIN gameobject_queststarter AS gq ON qt.ID = gq.quest
+            INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
+            INNER JOIN gameobject AS g ON gt.entry = g.id""",
+    b'SITEM': """
+        SELECT qt.ID, it.name, it.entry
+        FROM quest_template AS qt
+            INNER JOIN item_template AS it ON qt.ID = it.startquest""",
+    b'ENPC': """
+        SELECT qt.ID, ct.name, c.map, c.position_x, c.position_y
+        FROM quest_template AS qt
+            INNER JOIN creature_questender AS cq ON qt.ID = cq.quest
+            INNER JOIN creature_template AS ct ON cq.id = ct.entry
+            INNER JOIN creature AS c ON cq.id = c.id""",
+    b'EOBJ': """
+        SELECT qt.ID, gt.name, g.map, g.position_x, g.position_y
+        FROM quest_template AS qt
+            INNER JOIN gameobject_questender AS gq ON qt.ID = gq.quest
+            INNER JOIN gameobject_template AS gt ON gq.id = gt.entry
+            INNER JOIN gameobject AS g ON gt.entry = g.id""",
+    b'FLIGHT': """
+        SELECT c.map, ct.name, c.map, c.position_x, c.position_y
+        FROM creature_template AS ct
+            INNER JOIN creature AS c on ct.entry = c.id
+        WHERE ct.npcflag & 8192"""
+}
+
+
+def read_spawns():
+    """ read spawns of all kinds grouped by quest id or map """
+    global DBC
+
+    kinds = {}
+    for kind, query in SPAWN_QUERIES.items():
+        kinds[kind] = {}
+        num = DBC.execute(query)
+        for entry in DBC.fetchall():
+            kinds[kind].setdefault(entry[0], []).append(entry[1:])
+        print('%s: %d spawns' % (kind.decode('ascii'), num), file=sys.stderr)
+    return kinds
+
+
+def parse_args():
+    global DB, DBC, DBSTATS
+    parser = argparse.ArgumentParser()
+
+    # command line arguments for database connection
+    database = parser.add_argument_group('database')
+    database.add_argument(
+        '--dbname', dest='dbname', metavar='DATABASE', default='acore_world',
+        help='Name of database (default: %(default)s)')
+    database.add_argument(
+        '--backend', dest='backend', choices=dbbackend.BACKENDS,
+        default='mysql',
+        help='Database backend, the SQLite database is read from the file '
+             'DATABASE.sqlite (default: %(default)s)')
+    database.add_argument(
+        '-u', '--dbuser', dest='dbuser', metavar='USERNAME', default='reader',
+        help='User for database access (default: %(default)s)')
+    database.add_argument(
+        '-p', '--dbpass', dest='dbpass', metavar='PASSWORD', default='reader',
+        help='Password for database access (default: %(default)s)')
+    database.add_argument(
+        '--db-stats', dest='dbstats', action='store_true',
+        help='Print calls, rows and latency of each query at exit')
+    database.add_argument(
+        '--slow-query', dest='slowquery', metavar='MS', type=float,
+        help='Log queries taking at least MS milliseconds')
+
+    # command line arguments for output
+    output = parser.add_argument_group('output')
+    output.add_argument(
+        '-o', '--output', dest='output', metavar='FILE', required=True,
+        help='Write spawn snapshot to file')
+    opts = parser.parse_args()
+
+    # record calls and latency of the queries
+    if opts.dbstats or opts.slowquery is not None:
+        DBSTATS = dbbackend.QueryStats(opts.slowquery)
+        if opts.dbstats:
+            atexit.register(DBSTATS.print_summary)
+
+    # open database connection and create the cursor
+    try:
+        DB = dbbackend.connect(
+            opts.backend, opts.dbname, opts.dbuser, opts.dbpass, DBSTATS)
+    except dbbackend.DatabaseError as de:
+        print("ERROR: Could not connect to database %s" % opts.dbname,
+              '       %s' % de, sep='\n', file=sys.stderr)
+        sys.exit(1)
+    DBC = DB.cursor()
+
+    # return parsed options
+    return opts
+
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    options = parse_args()
+
+    # query spawns and write snapshot
+    spawns = read_spawns()
+    with open(options.output, 'wb') as outfile:
+        spawndb.write_spawns(outfile, spawns)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import dbbackend
+
+# number of rows copied with a single statement
+COPY_CHUNK = 5000
+
+
+def copy_world(source, target):
+    """ copy all tables and columns of the trimmed schema to target """
+    tables = [name for name, in target.connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    for table in tables:
+        columns = [column[1] for column in target.connection.execute(
+            'PRAGMA table_info(%s)' % table)]
+        target.connection.execute('DELETE FROM %s' % table)
+
+        # stream rows from the source database
+        cursor = source.cursor(stream=True)
+        cursor.execute('SELECT %s FROM %s' % (', '.join(columns), table))
+        insert = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            table, ', '.join(columns), ', '.join(['?'] * len(columns)))
+        num = 0
+        rows = cursor.fetchmany(COPY_CHUNK)
+        while rows:
+            target.connection.executemany(insert, rows)
+            num += len(rows)
+            rows = cursor.fetchmany(COPY_CHUNK)
+        cursor.close()
+        print('Copied %d rows of %s' % (num, table), file=sys.stderr)
+    target.connection.commit()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Copy the world database tables used by the TourGuide '
+                    'utilities into a SQLite database for the sqlite backend')
+    parser.add_argument(
+        'output', metavar='FILE',
+        help='SQLite database to write')
+
+    # command line arguments for database connection
+    database = parser.add_argument_group('database')
+    database.add_argument(
+        '--dbname', dest='dbname', metavar='DATABASE', default='acore_world',
+        help='Name of database (default: %(default)s)')
+    database.add_argument(
+        '-u', '--dbuser', dest='dbuser', metavar='USERNAME', default='reader',
+        help='User for database access (default: %(default)s)')
+    database.add_argument(
+        '-p', '--dbpass', dest='dbpass', metavar='PASSWORD', default='reader',
+        help='Password for database access (default: %(default)s)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    options = parse_args()
+
+    # open MySQL world database and SQLite output
+    try:
+        source = dbbackend.connect(
+            'mysql', options.dbname, options.dbuser, options.dbpass)
+    except dbbackend.DatabaseError as de:
+        print("ERROR: Could not connect to database %s" % options.dbname,
+              '       %s' % de, sep='\n', file=sys.stderr)
+        sys.exit(1)
+    try:
+        target = dbbackend.connect('sqlite', options.output, create=True)
+    except dbbackend.DatabaseError as de:
+        print("ERROR: Could not open database %s" % options.output,
+              '       %s' % de, sep='\n', file=sys.stderr)
+        sys.exit(1)
+
+    copy_world(source, target)
+    target.close()
+    source.close()
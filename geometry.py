@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+import math
+import mmap
+import zlib
+import struct
+import functools
+import collections
+import questdb
+import spatial
+
+# NumPy is optional and only imported for the first batch, without it
+# batches are converted point by point
+numpy = None
+NUMPY_IMPORTED = False
+
+# number of positions converted at once, bounds the memory used for the
+# positions by zones arrays
+BATCH_CHUNK = 4096
+
+# smaller batches are converted point by point, the NumPy overhead of each
+# call outweighs testing all zones at once
+BATCH_MIN = 16
+
+# default number of area grid cells along the longer side of a map
+GRID_CELLS = 256
+
+# area grid of a map: origin y, origin x, cell size, columns, rows
+GRID = struct.Struct('<dddII')
+
+# cell of an area grid without a single winning zone
+NO_WINNER = 0xFFFFFFFF
+
+# number of positions remembered by the memoized conversion
+COORDS_CACHE = 65536
+
+# zone of AREAS compiled for the conversion: name, id, mapping boundaries
+# and spans of the boundaries from the top left corner
+Zone = collections.namedtuple(
+    'Zone', 'name id ymax ymin xmax xmin yspan xspan')
+
+
+def compile_zones(zones):
+    """ compile the zones of a map in AREAS to a list of Zone """
+    return [Zone(zname, zinfo[0], zinfo[1], zinfo[2], zinfo[3], zinfo[4],
+                 zinfo[2] - zinfo[1], zinfo[4] - zinfo[3])
+            for zname, zinfo in zones.items()]
+
+
+def pick_zone(zones, posX, posY, zone=None):
+    """ get thottbot coordinates in the best of the compiled zones """
+
+    # record best match
+    area = None
+    tmap = None
+    thottX = None
+    thottY = None
+    tdist = 71.0
+
+    # iterate through all areas in the map
+    for zname, zid, ymax, ymin, xmax, xmin, yspan, xspan in zones:
+
+        # check if the coordinates fall inside mapping boundaries
+        if not ymax >= posY >= ymin or not xmax >= posX >= xmin:
+            continue
+
+        # calculate thottbot coordinates and distance from center (50,50)
+        tX = (posY - ymax) / yspan * 100
+        tY = (posX - xmax) / xspan * 100
+        tD = math.sqrt((50.0 - tX) ** 2 + (50.0 - tY) ** 2)
+
+        # return coordinates if zone was explicitly requested
+        if zone is not None and zone == zname:
+            return tX, tY, zname
+
+        # the area with thottbot coordinates closest to the center wins,
+        # except for the global zones with an id of zero (Azeroth, Kalimdor)
+        if area is None or tmap == 0 or (zid > 0 and tdist > tD):
+            area = zname
+            tmap = zid
+            thottX = tX
+            thottY = tY
+            tdist = tD
+
+    # return either best match or none
+    if area is not None:
+        return thottX, thottY, area
+    return None
+
+
+class AreaTable:
+    """ AREAS compiled once for converting world to thottbot coordinates
+
+    Positions are converted one at a time by thott_coords(), memoized by
+    cached_coords() and in batches by convert() and coords(). The zone is
+    picked the same way by all of them: the requested zone, else the zone
+    with an id above zero closest to its center, else the last global zone.
+
+    Single positions only test the zones of their slab in a spatial index of
+    the mapping boundaries, or the candidates of their cell if an area grid
+    written by write_grid() is given. Batches test the boxes of all zones of
+    a map against a chunk of positions at once, without NumPy they are
+    converted one by one. Every zone gets an id, its index in zones.
+
+    Thottbot coordinates are converted back to world positions on the map
+    of the zone by world_coords() and to_world().
+    """
+
+    def __init__(self, areas, grid=None):
+        self.areas = areas
+        self.zones = []
+        self.ids = {}
+        self.names = {}
+        self.index = {}
+        self.first = {}
+        self.maps = None
+        for map, zones in areas.items():
+            compiled = compile_zones(zones)
+            self.index[map] = spatial.BoxIndex(
+                [(z.ymin, z.ymax, z.xmin, z.xmax) for z in compiled], compiled)
+            for z in compiled:
+                self.names.setdefault(z.name, (map, z))
+            self.first[map] = len(self.zones)
+            for zname in zones:
+                self.ids[(map, zname)] = len(self.zones)
+                self.zones.append((map, zname))
+        self.grid = None if grid is None else AreaGrid(grid, areas)
+        self.cached_coords = functools.lru_cache(COORDS_CACHE)(
+            self.thott_coords)
+
+    def thott_coords(self, map, posX, posY, zone=None):
+        """ convert world coordinates to thottbot coordinates, returns
+        (x, y, zone name) or None for positions outside all zones """
+
+        # bail early if map is not in AREAS
+        if map not in self.index:
+            return None
+        if self.grid is not None:
+            return self.grid.thott_coords(map, posX, posY, zone)
+        return pick_zone(self.index[map].query(posY, posX), posX, posY, zone)
+
+    def convert(self, maps, xs, ys, zone=None):
+        """ convert positions to arrays of zone ids, thottbot x and y
+
+        Positions outside of all zones get the zone id -1. Without NumPy
+        lists are returned instead of arrays.
+        """
+        if import_numpy() is None:
+            result = ([], [], [])
+            for map, posX, posY in zip(maps, xs, ys):
+                coords = self.thott_coords(map, posX, posY, zone)
+                if coords is None:
+                    coords = (math.nan, math.nan, None)
+                    result[0].append(-1)
+                else:
+                    result[0].append(self.ids[(map, coords[2])])
+                result[1].append(coords[0])
+                result[2].append(coords[1])
+            return result
+        if self.maps is None:
+            self._compile_maps()
+
+        maps = numpy.asarray(maps, dtype=numpy.int64).reshape(-1)
+        xs = numpy.asarray(xs, dtype=numpy.float64).reshape(-1)
+        ys = numpy.asarray(ys, dtype=numpy.float64).reshape(-1)
+        zoneids = numpy.full(len(maps), -1, dtype=numpy.int64)
+        tx = numpy.full(len(maps), numpy.nan)
+        ty = numpy.full(len(maps), numpy.nan)
+        for map in numpy.unique(maps).tolist():
+            rows = numpy.flatnonzero(maps == map)
+            if map in self.maps:
+                for start in range(0, len(rows), BATCH_CHUNK):
+                    self._convert_map(
+                        map, rows[start:start + BATCH_CHUNK], xs, ys, zone,
+                        zoneids, tx, ty)
+            elif map in self.areas:
+                for row in rows.tolist():
+                    coords = self.thott_coords(
+                        map, float(xs[row]), float(ys[row]), zone)
+                    if coords is not None:
+                        zoneids[row] = self.ids[(map, coords[2])]
+                        tx[row], ty[row] = coords[0], coords[1]
+        return zoneids, tx, ty
+
+    def _compile_maps(self):
+        """ compile the zone boxes of each map into arrays for batches """
+        self.maps = {}
+        for map, zones in self.areas.items():
+            if not zones:
+                continue
+
+            # negative zone ids break the pick order, convert one by one
+            info = numpy.array([zinfo[:5] for zinfo in zones.values()],
+                               dtype=numpy.float64)
+            if (info[:, 0] < 0).any():
+                continue
+            self.maps[map] = (self.first[map], info)
+
+    def _convert_map(self, map, rows, xs, ys, zone, zoneids, tx, ty):
+        """ convert positions of rows on a single compiled map """
+        first, info = self.maps[map]
+        ids, ymax, ymin, xmax, xmin = info.T
+        posx = xs[rows, None]
+        posy = ys[rows, None]
+
+        # boxes containing each position, thottbot coordinates and distance
+        inside = (ymax >= posy) & (posy >= ymin) & \
+            (xmax >= posx) & (posx >= xmin)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            tX = (posy - ymax) / (ymin - ymax) * 100
+            tY = (posx - xmax) / (xmin - xmax) * 100
+            tD = numpy.sqrt((50.0 - tX) ** 2 + (50.0 - tY) ** 2)
+
+        # first zone closest to its center among zones with an id above
+        # zero, else the last containing zone as global zones replace
+        # each other
+        positive = inside & (ids > 0)
+        closest = numpy.argmin(numpy.where(positive, tD, numpy.inf), axis=1)
+        last = inside.shape[1] - 1 - numpy.argmax(inside[:, ::-1], axis=1)
+        pick = numpy.where(positive.any(axis=1), closest, last)
+
+        # requested zone wins if it contains the position
+        if zone is not None and (map, zone) in self.ids:
+            requested = self.ids[(map, zone)] - first
+            pick = numpy.where(inside[:, requested], requested, pick)
+
+        found = inside.any(axis=1)
+        chunk = numpy.arange(len(rows))
+        zoneids[rows] = numpy.where(found, first + pick, -1)
+        tx[rows] = numpy.where(found, tX[chunk, pick], numpy.nan)
+        ty[rows] = numpy.where(found, tY[chunk, pick], numpy.nan)
+
+    def coords(self, maps, xs, ys, zone=None):
+        """ convert positions to a list of (x, y, zone name) tuples like
+        thott_coords() returns them """
+        if len(maps) < BATCH_MIN:
+            return [self.thott_coords(map, posX, posY, zone)
+                    for map, posX, posY in zip(maps, xs, ys)]
+        zoneids, tx, ty = self.convert(maps, xs, ys, zone)
+        if numpy is not None:
+            zoneids, tx, ty = zoneids.tolist(), tx.tolist(), ty.tolist()
+        return [None if zoneid < 0 else (x, y, self.zones[zoneid][1])
+                for zoneid, x, y in zip(zoneids, tx, ty)]
+
+    def world_coords(self, zone, x, y):
+        """ convert thottbot coordinates in a zone to (map, posX, posY),
+        None if the zone is not in AREAS """
+        if zone not in self.names:
+            return None
+        map, z = self.names[zone]
+        return map, z.xmax + y / 100 * z.xspan, z.ymax + x / 100 * z.yspan
+
+    def to_world(self, zones, xs, ys):
+        """ convert thottbot coordinates in zones to arrays of maps, world
+        x and y, unknown zones get the map -1
+
+        Without NumPy lists are returned instead of arrays.
+        """
+        if import_numpy() is None:
+            result = ([], [], [])
+            for zone, x, y in zip(zones, xs, ys):
+                coords = self.world_coords(zone, x, y)
+                if coords is None:
+                    coords = (-1, math.nan, math.nan)
+                for column, value in zip(result, coords):
+                    column.append(value)
+            return result
+
+        # bounds and spans of the zone of each position
+        unknown = (-1, Zone(None, 0, *[math.nan] * 6))
+        info = numpy.array(
+            [(map, z.ymax, z.xmax, z.yspan, z.xspan) for map, z in
+             (self.names.get(zone, unknown) for zone in zones)],
+            dtype=numpy.float64).reshape(-1, 5)
+        xs = numpy.asarray(xs, dtype=numpy.float64).reshape(-1)
+        ys = numpy.asarray(ys, dtype=numpy.float64).reshape(-1)
+        return (info[:, 0].astype(numpy.int64),
+                info[:, 2] + ys / 100 * info[:, 4],
+                info[:, 1] + xs / 100 * info[:, 3])
+
+
+def import_numpy():
+    """ import NumPy on first use, returns None if it is not installed """
+    global numpy, NUMPY_IMPORTED
+    if not NUMPY_IMPORTED:
+        NUMPY_IMPORTED = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+
+def areas_checksum(areas):
+    """ get checksum of AREAS to tell if an area grid belongs to them """
+    return zlib.crc32(repr(sorted(
+        (map, list(zones.items())) for map, zones in areas.items())).encode())
+
+
+def write_grid(stream, areas, cells=GRID_CELLS):
+    """ write area grid of AREAS to a binary stream
+
+    Each map is covered by a uniform grid of square cells. A cell lists the
+    zones whose boxes overlap it and the winning zone if the cell lies
+    completely inside of all of them and the winner does not depend on the
+    position. Cells are slightly enlarged, so positions rounded into a
+    neighbour cell still find their zones.
+    """
+    sections = [(b'AREAGRID', struct.pack('<I', areas_checksum(areas)))]
+    for map, zones in areas.items():
+        boxes = compile_zones(zones)
+        if not boxes:
+            continue
+        y0 = min(z.ymin for z in boxes)
+        x0 = min(z.xmin for z in boxes)
+        height = max(z.ymax for z in boxes) - y0
+        width = max(z.xmax for z in boxes) - x0
+        size = max(height, width) / cells or 1.0
+        columns = int(height // size) + 1
+        rows = int(width // size) + 1
+        margin = size * 1e-6
+
+        # zones are only picked by position if ids are not negative
+        winners = not any(z.id < 0 for z in boxes)
+        starts = []
+        candidates = []
+        winner = []
+        for row in range(rows):
+            lowx = x0 + row * size - margin
+            highx = x0 + (row + 1) * size + margin
+            for column in range(columns):
+                lowy = y0 + column * size - margin
+                highy = y0 + (column + 1) * size + margin
+                cell = [num for num, z in enumerate(boxes)
+                        if z.ymin <= highy and z.ymax >= lowy and
+                        z.xmin <= highx and z.xmax >= lowx]
+                starts.append(len(candidates))
+                candidates.extend(cell)
+
+                # winner of cells inside all their zones: the only zone
+                # with an id above zero, else the last global zone
+                inside = all(
+                    boxes[num].ymin <= lowy and boxes[num].ymax >= highy and
+                    boxes[num].xmin <= lowx and boxes[num].xmax >= highx
+                    for num in cell)
+                positive = [num for num in cell if boxes[num].id > 0]
+                if not winners or not cell or not inside or len(positive) > 1:
+                    winner.append(NO_WINNER)
+                else:
+                    winner.append(positive[0] if positive else cell[-1])
+        starts.append(len(candidates))
+
+        prefix = str(map).encode('ascii') + b'.'
+        sections.append((prefix + b'GRID',
+                         GRID.pack(y0, x0, size, columns, rows)))
+        sections.append((prefix + b'STARTS', questdb.pack_uints(starts)))
+        sections.append((prefix + b'CANDS', questdb.pack_uints(candidates)))
+        sections.append((prefix + b'WINNERS', questdb.pack_uints(winner)))
+    questdb.write_sections(stream, sections)
+
+
+class AreaGrid:
+    """ memory mapped area grid of AREAS written by write_grid()
+
+    Resolving a position takes the cell of the position and either its
+    winning zone or the pick among its few candidate zones.
+    """
+
+    def __init__(self, path, areas):
+        with open(path, 'rb') as grid:
+            self._buf = mmap.mmap(grid.fileno(), 0, access=mmap.ACCESS_READ)
+        sections = questdb.read_sections(self._buf)
+        if b'AREAGRID' not in sections:
+            raise ValueError("Not an area grid")
+        if struct.unpack_from('<I', self._buf, sections[b'AREAGRID'][0])[0] != \
+                areas_checksum(areas):
+            raise ValueError("Area grid was built from different AREAS")
+
+        self.areas = areas
+        self.maps = {}
+        for map, zones in areas.items():
+            prefix = str(map).encode('ascii') + b'.'
+            if prefix + b'GRID' not in sections:
+                continue
+            compiled = compile_zones(zones)
+            self.maps[map] = (
+                compiled, {z.name: z for z in compiled},
+                GRID.unpack_from(self._buf, sections[prefix + b'GRID'][0]),
+                questdb.uint_view(self._buf, *sections[prefix + b'STARTS']),
+                questdb.uint_view(self._buf, *sections[prefix + b'CANDS']),
+                questdb.uint_view(self._buf, *sections[prefix + b'WINNERS']))
+
+    def thott_coords(self, map, posX, posY, zone=None):
+        """ convert world coordinates to thottbot coordinates like
+        AreaTable.thott_coords() does """
+        if map not in self.maps:
+            return None
+        zones, names, (y0, x0, size, columns, rows), starts, candidates, \
+            winners = self.maps[map]
+
+        # requested zone wins if it contains the position
+        if zone in names:
+            z = names[zone]
+            if z.ymax >= posY >= z.ymin and z.xmax >= posX >= z.xmin:
+                return pick_zone([z], posX, posY)
+
+        column = int((posY - y0) // size)
+        row = int((posX - x0) // size)
+        if not 0 <= column < columns or not 0 <= row < rows:
+            return None
+        cell = row * columns + column
+        winner = winners[cell]
+        if winner != NO_WINNER:
+            z = zones[winner]
+            return ((posY - z.ymax) / z.yspan * 100,
+                    (posX - z.xmax) / z.xspan * 100, z.name)
+        return pick_zone([zones[num] for num in
+                          candidates[starts[cell]:starts[cell + 1]]],
+                         posX, posY)
+
+
+def nearest_spawns(positions, spawns):
+    """ get distance to and index of the nearest spawn for each position
+
+    positions are (maps, xs, ys) and spawns are (owners, maps, xs, ys) with
+    the index of the position each spawn is compared to. Positions without
+    a spawn on their map get an infinite distance and the index -1.
+    """
+    if import_numpy() is None:
+        distances = [math.inf] * len(positions[0])
+        nearest = [-1] * len(positions[0])
+        for num, (owner, map, posX, posY) in enumerate(zip(*spawns)):
+            if positions[0][owner] != map:
+                continue
+            distance = math.hypot(positions[1][owner] - posX,
+                                  positions[2][owner] - posY)
+            if distance < distances[owner]:
+                distances[owner] = distance
+                nearest[owner] = num
+        return distances, nearest
+
+    maps, xs, ys = [numpy.asarray(column) for column in positions]
+    owners, spawnmaps, spawnxs, spawnys = [
+        numpy.asarray(column) for column in spawns]
+    distances = numpy.full(len(maps), numpy.inf)
+    nearest = numpy.full(len(maps), -1, dtype=numpy.int64)
+    if not len(owners):
+        return distances, nearest
+    owners = owners.astype(numpy.int64)
+    distance = numpy.where(
+        maps[owners] == spawnmaps,
+        numpy.hypot(xs[owners] - spawnxs, ys[owners] - spawnys), numpy.inf)
+
+    # closest spawn of each owner is the first one ordered by distance
+    order = numpy.lexsort((distance, owners))
+    owned, first = numpy.unique(owners[order], return_index=True)
+    closest = order[first]
+    distances[owned] = distance[closest]
+    nearest[owned] = numpy.where(
+        numpy.isfinite(distance[closest]), closest, -1)
+    return distances, nearest
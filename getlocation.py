@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 import sys
-import math
+import atexit
 import pprint
 import argparse
-import MySQLdb
+import geometry
+import dbbackend
 
 # prettyprinter
 PP = pprint.PrettyPrinter(indent=4)
@@ -11,6 +12,12 @@ PP = pprint.PrettyPrinter(indent=4)
 # database connection cursor for querying information
 DBC = None
 
+# calls and latency of the database queries
+DBSTATS = None
+
+# AREAS compiled for coordinate conversion
+AREACOORDS = None
+
 
 def display_creature(name, zone=None):
     """ display creature location """
@@ -22,70 +29,28 @@ def display_creature(name, zone=None):
             INNER JOIN creature AS c ON ct.entry = c.id
         WHERE ct.name LIKE %s""", ('%%%s%%' % name,))
     if num > 0:
-        for entry in DBC.fetchall():
-            c1 = get_thott_coords(entry[2], entry[3], entry[4])
+        # convert coordinates of all results at once
+        dbresult = DBC.fetchall()
+        positions = list(zip(*[entry[2:5] for entry in dbresult]))
+        coords1 = AREACOORDS.coords(*positions)
+        coords2 = [None] * len(dbresult)
+        if zone is not None:
+            coords2 = AREACOORDS.coords(*positions, zone=zone)
+
+        for entry, c1, c2 in zip(dbresult, coords1, coords2):
             if c1 is not None:
                 print("{0:5d} {1:30s} |M|{2:.2f},{3:.2f}|Z|{4:s}|".format(
                     entry[0], entry[1],
                     c1[0] + 0.005, c1[1] + 0.005, c1[2]))
-            if zone is not None:
-                c2 = get_thott_coords(entry[2], entry[3], entry[4], zone)
-                if c2 is not None and c2 != c1:
-                    print("{0:5d} {1:30s} |M|{2:.2f},{3:.2f}|Z|{4:s}|".format(
-                        entry[0], entry[1],
-                        c2[0] + 0.005, c2[1] + 0.005, c2[2]))
-
-
-def get_thott_coords(map, posX, posY, zone=None):
-    """ convert world coordinates to thottbot coordinates """
-
-    # bail early if map is not in AREAS
-    if map not in AREAS:
-        return None
-
-    # record best match
-    area = None
-    tmap = None
-    thottX = None
-    thottY = None
-    tdist = 71.0
-
-    # iterate through all areas in the map
-    for zname, zinfo in AREAS[map].items():
-
-        # check if the coordinates fall inside mapping boundaries
-        if not zinfo[1] >= posY >= zinfo[2] or not zinfo[3] >= posX >= zinfo[4]:
-            continue
-
-        # calculate thottbot coordinates and distance from center (50,50)
-        tX = (posY - zinfo[1]) / (zinfo[2] - zinfo[1]) * 100
-        tY = (posX - zinfo[3]) / (zinfo[4] - zinfo[3]) * 100
-        tD = math.sqrt((50.0 - tX) ** 2 + (50.0 - tY) ** 2)
-
-        # return coordinates if zone was explicitly requested
-        if zone is not None and zone == zname:
-            return tX, tY, zname
-
-        # hack to find correct zone in the overlapping area list:
-        # we use the area with thottbot coordinates closest to the center
-        # except for the global zones with an id of zero (Azeroth, Kalimdor)
-        if area is None or tmap == 0 or (zinfo[0] > 0 and tdist > tD):
-            area = zname
-            tmap = zinfo[0]
-            thottX = tX
-            thottY = tY
-            tdist = tD
-
-    # return either best match or none
-    if area is not None:
-        return thottX, thottY, area
-    else:
-        return None
+            if c2 is not None and c2 != c1:
+                print("{0:5d} {1:30s} |M|{2:.2f},{3:.2f}|Z|{4:s}|".format(
+                    entry[0], entry[1],
+                    c2[0] + 0.005, c2[1] + 0.005, c2[2]))
 
 
 def parse_args():
     """ parse command line arguments """
-    global QID_RACES, QID_CLASSES
+    global QID_RACES, QID_CLASSES, DBSTATS
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -93,26 +58,46 @@ def parse_args():
     parser.add_argument(
         '-z', '--zone', dest='zone', metavar='ZONE',
         help='To zone')
+    parser.add_argument(
+        '--areagrid', dest='areagrid', metavar='FILE',
+        help='Resolve zones of positions with precomputed area grid')
 
     # database connection
     database = parser.add_argument_group('database')
     database.add_argument(
         '--dbname', dest='dbname', metavar='DATABASE', default='acore_world',
         help='Name of database (default: %(default)s)')
+    database.add_argument(
+        '--backend', dest='backend', choices=dbbackend.BACKENDS,
+        default='mysql',
+        help='Database backend, the SQLite database is read from the file '
+             'DATABASE.sqlite (default: %(default)s)')
     database.add_argument(
         '-u', '--dbuser', dest='dbuser', metavar='USERNAME', default='reader',
         help='User for database access (default: %(default)s)')
     database.add_argument(
         '-p', '--dbpass', dest='dbpass', metavar='PASSWORD', default='reader',
         help='Password for database access (default: %(default)s)')
+    database.add_argument(
+        '--db-stats', dest='dbstats', action='store_true',
+        help='Print calls, rows and latency of each query at exit')
+    database.add_argument(
+        '--slow-query', dest='slowquery', metavar='MS', type=float,
+        help='Log queries taking at least MS milliseconds')
     opts = parser.parse_args()
 
+    # record calls and latency of the queries
+    if opts.dbstats or opts.slowquery is not None:
+        DBSTATS = dbbackend.QueryStats(opts.slowquery)
+        if opts.dbstats:
+            atexit.register(DBSTATS.print_summary)
+
     try:
-        dbconnection = MySQLdb.connect(
-            db=opts.dbname, user=opts.dbuser, passwd=opts.dbpass)
-    except MySQLdb.OperationalError as oe:
+        dbconnection = dbbackend.connect(
+            opts.backend, opts.dbname, opts.dbuser, opts.dbpass, DBSTATS)
+    except dbbackend.DatabaseError as de:
         print("ERROR: Could not connect to database %s" % opts.dbname,
-              '       %s' % repr(oe), sep='\n', file=sys.stderr)
+              '       %s' % de, sep='\n', file=sys.stderr)
         sys.exit(1)
 
     # create a cursor to use for database connections
@@ -125,6 +110,15 @@ def parse_args():
     from filter_info_pre import AREAS
     from filter_info_pre import AREATABLE
 
+    # compile AREAS for coordinate conversion, with area grid if given
+    global AREACOORDS
+    try:
+        AREACOORDS = geometry.AreaTable(AREAS, opts.areagrid)
+    except (OSError, ValueError) as err:
+        print("ERROR: Could not read area grid %s" % opts.areagrid,
+              '       %s' % repr(err), sep='\n', file=sys.stderr)
+        sys.exit(1)
+
     # return parsed options
     return opts
 
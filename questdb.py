@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+import io
+import re
+import sys
+import mmap
+import array
+import struct
+import marshal
+import runpy
+import heapq
+import bisect
+import shutil
+import sqlite3
+import tempfile
+import collections.abc
+
+# magic and version of binary quest snapshots
+SNAPSHOT_MAGIC = b'TGQS'
+SNAPSHOT_VERSION = 1
+
+# snapshot header: magic, version, number of sections
+HEADER = struct.Struct('<4sHH')
+
+# section directory entry following the header: name, offset, length
+SECTION = struct.Struct('<16sII')
+
+# maximum length of a variant name, so its section names fit the directory
+VARIANT_LENGTH = 11
+
+# names of the filter_info module variables stored in INFO sections
+INFO_KEYS = ('QUESTXP', 'AREAS', 'AREATABLE')
+
+# first bytes of a SQLite database file
+SQLITE_MAGIC = b'SQLite format 3\0'
+
+# race masks of the factions with precomputed quest bitsets in snapshots
+FACTION_RACES = {
+    b'ALLIANCE': 1 + 4 + 8 + 64 + 1024,
+    b'HORDE': 2 + 16 + 32 + 128 + 512
+}
+
+# entry of the QuestSortID index: sort, first row in SORTROWS, row count
+SORTINDEX = struct.Struct('<iII')
+
+# fixed width quest record, in order:
+# name offset, name length, sort, info, lvls (3), link (4), reqs (2), diff
+RECORD = struct.Struct('<IHiHhhhiiiiIIB')
+
+# name length of quests without a name (NULL LogTitle)
+NULL_NAME = 0xFFFF
+
+
+def write_sections(stream, sections):
+    """ write named sections with header and directory to a binary stream
+
+    Section data is either bytes or a binary file that is copied from its
+    start, so large sections can be spooled to disk while being generated.
+    """
+    sizes = []
+    for name, data in sections:
+        if isinstance(data, (bytes, bytearray)):
+            sizes.append(len(data))
+        else:
+            sizes.append(data.seek(0, io.SEEK_END))
+            data.seek(0)
+    offset = HEADER.size + SECTION.size * len(sections)
+    stream.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections)))
+    for (name, data), size in zip(sections, sizes):
+        stream.write(SECTION.pack(name, offset, size))
+        offset += size
+    for name, data in sections:
+        if isinstance(data, (bytes, bytearray)):
+            stream.write(data)
+        else:
+            shutil.copyfileobj(data, stream)
+
+
+def read_sections(buf):
+    """ read the section directory of a snapshot into a dict """
+    magic, version, num = HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a quest snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported quest snapshot version %d" % version)
+    sections = {}
+    for i in range(num):
+        name, offset, length = SECTION.unpack_from(
+            buf, HEADER.size + i * SECTION.size)
+        sections[name.rstrip(b'\0')] = (offset, length)
+    return sections
+
+
+def pack_uints(values):
+    """ pack a sequence of unsigned ints as little endian 32 bit values """
+    return struct.pack('<%dI' % len(values), *values)
+
+
+def uint_view(buf, offset, length):
+    """ view packed little endian 32 bit values without copying if possible """
+    if sys.byteorder == 'little':
+        return memoryview(buf)[offset:offset + length].cast('I')
+    values = array.array('I', buf[offset:offset + length])
+    values.byteswap()
+    return values
+
+
+class SnapshotWriter:
+    """ incrementally write quests in ascending QID order as binary snapshot
+
+    QIDs, records and names are spooled to temporary files. Only the rows
+    per QuestSortID and the faction bitsets for the precomputed indexes are
+    kept in memory, at a few bytes per quest.
+
+    With a variant name the quests written are the base variant, further
+    variants are added as overlays of the records that differ from it.
+    Area information of a variant is only stored if it differs from the
+    area information of the base variant.
+    """
+
+    def __init__(self, stream, variant=None):
+        if variant is not None and len(variant) > VARIANT_LENGTH:
+            raise ValueError("Variant name '%s' too long" % variant)
+        self._stream = stream
+        self._variant = variant
+        self._overlays = []
+        self._infos = {}
+        self._qids = tempfile.TemporaryFile()
+        self._recs = tempfile.TemporaryFile()
+        self._strs = tempfile.TemporaryFile()
+        self._strsize = 0
+        self._last = None
+        self._rows = 0
+        self._sorts = {}
+        self._factions = {name: bytearray() for name in FACTION_RACES}
+        self._factions[b'NEUTRAL'] = bytearray()
+
+    def add(self, qid, quest):
+        if self._last is not None and qid <= self._last:
+            raise ValueError("QID %d written after QID %d" % (qid, self._last))
+        self._last = qid
+        self._qids.write(pack_uints((qid,)))
+        self._recs.write(self._pack(quest))
+
+        # index row by QuestSortID and set faction bits
+        row = self._rows
+        self._rows += 1
+        self._sorts.setdefault(quest['sort'], array.array('I')).append(row)
+        for faction, bits in self._factions.items():
+            if row % 8 == 0:
+                bits.append(0)
+            if faction in FACTION_RACES:
+                member = quest['reqs'][0] & FACTION_RACES[faction]
+            else:
+                member = quest['reqs'][0] == 0
+            if member:
+                bits[row // 8] |= 1 << (row % 8)
+
+    def _pack(self, quest):
+        """ pack a quest record and spool its name """
+        name = b'' if quest['name'] is None else quest['name'].encode('utf-8')
+        record = RECORD.pack(
+            self._strsize, NULL_NAME if quest['name'] is None else len(name),
+            quest['sort'], quest['info'],
+            *quest['lvls'], *quest['link'], *quest['reqs'], quest['diff'])
+        self._strs.write(name)
+        self._strsize += len(name)
+        return record
+
+    def add_overlay(self, variant, quests, base):
+        """ add variant with only the quests differing from the base quests """
+        if self._variant is None:
+            raise ValueError("Overlay variants need a named base variant")
+        if len(variant) > VARIANT_LENGTH:
+            raise ValueError("Variant name '%s' too long" % variant)
+        qids = []
+        records = bytearray()
+        for qid in sorted(quests):
+            if qid in base and base[qid] == quests[qid]:
+                continue
+            qids.append(qid)
+            records += self._pack(quests[qid])
+        removed = sorted(set(base) - set(quests))
+        self._overlays.append((variant, qids, bytes(records), removed))
+
+    def add_info(self, info, variant=None):
+        """ add area information, a dict of INFO_KEYS, of the base variant
+        or another variant """
+        self._infos[variant] = marshal.dumps(
+            {key: info[key] for key in INFO_KEYS})
+
+    def close(self):
+        sortindex = bytearray()
+        sortrows = array.array('I')
+        for sort in sorted(self._sorts):
+            rows = self._sorts[sort]
+            sortindex += SORTINDEX.pack(sort, len(sortrows), len(rows))
+            sortrows.extend(rows)
+        write_sections(self._stream, [
+            (b'QIDS', self._qids),
+            (b'RECS', self._recs),
+            (b'STRS', self._strs),
+            (b'SORTINDEX', bytes(sortindex)),
+            (b'SORTROWS', pack_uints(sortrows)),
+            *((name, bytes(bits)) for name, bits in self._factions.items()),
+            *self._info_sections(),
+            *self._variant_sections()])
+        self._qids.close()
+        self._recs.close()
+        self._strs.close()
+
+    def _info_sections(self):
+        """ get sections holding the area information of the variants """
+        base = self._infos.get(None, self._infos.get(self._variant))
+        sections = [] if base is None else [(b'INFO', base)]
+        for variant, info in self._infos.items():
+            if variant not in (None, self._variant) and info != base:
+                sections.append((variant.encode('ascii') + b'.INFO', info))
+        return sections
+
+    def _variant_sections(self):
+        """ get sections listing the variants and holding the overlays """
+        if self._variant is None:
+            return []
+        names = [self._variant] + [overlay[0] for overlay in self._overlays]
+        sections = [(b'VARIANTS', '\n'.join(names).encode('ascii'))]
+        for variant, qids, records, removed in self._overlays:
+            prefix = variant.encode('ascii') + b'.'
+            sections.extend([
+                (prefix + b'QIDS', pack_uints(qids)),
+                (prefix + b'RECS', records),
+                (prefix + b'DELS', pack_uints(removed))])
+        return sections
+
+
+def write_snapshot(stream, quests):
+    """ write a QUESTS dict as binary snapshot to a binary stream """
+    writer = SnapshotWriter(stream)
+    for qid in sorted(quests):
+        writer.add(qid, quests[qid])
+    writer.close()
+
+
+def search(values, value):
+    """ get position of value in sorted values or None """
+    pos = bisect.bisect_left(values, value)
+    if pos < len(values) and values[pos] == value:
+        return pos
+    return None
+
+
+class QuestSnapshot(collections.abc.Mapping):
+    """ read-only QUESTS mapping on a memory mapped binary snapshot
+
+    The sorted QID section serves as QID to record offset index, quest
+    records are only decoded on first access and cached afterwards.
+
+    Snapshots can hold several variants, records of the base variant are
+    shared and other variants only store their differing or removed quests.
+    """
+
+    def __init__(self, path, variant=None):
+        with open(path, 'rb') as snapshot:
+            self._buf = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        sections = read_sections(self._buf)
+        self._qids = uint_view(self._buf, *sections[b'QIDS'])
+        self._recs = sections[b'RECS'][0]
+        self._strs = sections[b'STRS'][0]
+        self._cache = {}
+
+        # precomputed indexes, missing in older snapshots
+        self._sortindex = None
+        self._factions = {}
+        if b'SORTINDEX' in sections:
+            offset, length = sections[b'SORTINDEX']
+            self._sortindex = {
+                sort: (start, count) for sort, start, count in
+                SORTINDEX.iter_unpack(self._buf[offset:offset + length])}
+            self._sortrows = uint_view(self._buf, *sections[b'SORTROWS'])
+            for name in (*FACTION_RACES, b'NEUTRAL'):
+                offset, length = sections[name]
+                self._factions[name] = self._buf[offset:offset + length]
+
+        # overlay of the selected variant, snapshots without variant list
+        # hold a single unnamed variant
+        self.variants = []
+        if b'VARIANTS' in sections:
+            offset, length = sections[b'VARIANTS']
+            self.variants = self._buf[offset:offset + length].decode(
+                'ascii').split('\n')
+        self._overlay = None
+        self._len = len(self._qids)
+        if variant is not None and variant not in self.variants:
+            raise ValueError("No variant '%s' in quest snapshot" % variant)
+
+        # area information of the variant, else of the base variant
+        self._info = sections.get(b'INFO')
+        if variant is not None and \
+                variant.encode('ascii') + b'.INFO' in sections:
+            self._info = sections[variant.encode('ascii') + b'.INFO']
+
+        if variant is not None and variant != self.variants[0]:
+            prefix = variant.encode('ascii') + b'.'
+            self._overlay = uint_view(self._buf, *sections[prefix + b'QIDS'])
+            self._overlay_recs = sections[prefix + b'RECS'][0]
+            self._removed = uint_view(self._buf, *sections[prefix + b'DELS'])
+            self._hidden = set(self._overlay) | set(self._removed)
+            self._len += sum(1 for qid in self._overlay
+                             if search(self._qids, qid) is None)
+            self._len -= len(self._removed)
+
+    def info(self):
+        """ get dict of INFO_KEYS of the selected variant or None if the
+        snapshot holds no area information """
+        if self._info is None:
+            return None
+        offset, length = self._info
+        return marshal.loads(self._buf[offset:offset + length])
+
+    def _offset(self, qid):
+        """ get record offset of a qid or None """
+        if not isinstance(qid, int):
+            return None
+        if self._overlay is not None:
+            pos = search(self._overlay, qid)
+            if pos is not None:
+                return self._overlay_recs + pos * RECORD.size
+            if search(self._removed, qid) is not None:
+                return None
+        pos = search(self._qids, qid)
+        if pos is not None:
+            return self._recs + pos * RECORD.size
+        return None
+
+    def _decode(self, offset):
+        """ decode a quest record into a QUESTS style dict """
+        rec = RECORD.unpack_from(self._buf, offset)
+        start = self._strs + rec[0]
+        return {
+            'name': None if rec[1] == NULL_NAME else
+            self._buf[start:start + rec[1]].decode('utf-8'),
+            'sort': rec[2],
+            'info': rec[3],
+            'lvls': rec[4:7],
+            'link': rec[7:11],
+            'reqs': rec[11:13],
+            'diff': rec[13]
+        }
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        if self._overlay is None:
+            return iter(self._qids)
+        return heapq.merge(
+            (qid for qid in self._qids if qid not in self._hidden),
+            self._overlay)
+
+    def __contains__(self, qid):
+        return qid in self._cache or self._offset(qid) is not None
+
+    def __getitem__(self, qid):
+        if qid in self._cache:
+            return self._cache[qid]
+        offset = self._offset(qid)
+        if offset is None:
+            raise KeyError(qid)
+        quest = self._cache[qid] = self._decode(offset)
+        return quest
+
+    def items(self):
+        """ iterate over all quests without adding them to the cache """
+        if self._overlay is not None:
+            for qid in self:
+                if qid in self._cache:
+                    yield qid, self._cache[qid]
+                else:
+                    yield qid, self._decode(self._offset(qid))
+            return
+        for pos, qid in enumerate(self._qids):
+            if qid in self._cache:
+                yield qid, self._cache[qid]
+            else:
+                yield qid, self._decode(self._recs + pos * RECORD.size)
+
+    def records(self):
+        """ iterate over (qid, name, fields) of all quests without decoding
+        them into dicts, fields are the RECORD values after the name """
+        for qid in self:
+            rec = RECORD.unpack_from(self._buf, self._offset(qid))
+            start = self._strs + rec[0]
+            name = None if rec[1] == NULL_NAME else \
+                self._buf[start:start + rec[1]].decode('utf-8')
+            yield qid, name, rec[2:]
+
+    def titles(self):
+        """ iterate over (qid, name, sort, races) of all quests, only the
+        name is decoded from the record """
+        strs = self._strs
+        if self._overlay is None:
+            end = self._recs + len(self._qids) * RECORD.size
+            recs = zip(self._qids,
+                       RECORD.iter_unpack(self._buf[self._recs:end]))
+        else:
+            recs = ((qid, RECORD.unpack_from(self._buf, self._offset(qid)))
+                    for qid in self)
+        for qid, rec in recs:
+            if rec[1] == NULL_NAME:
+                continue
+            start = strs + rec[0]
+            yield (qid, self._buf[start:start + rec[1]].decode('utf-8'),
+                   rec[2], rec[11])
+
+    def _faction_rows(self, races):
+        """ get bitsets of rows available to a faction race mask or None """
+        if not self._factions:
+            return None
+        for name, mask in FACTION_RACES.items():
+            if races == mask:
+                return self._factions[name], self._factions[b'NEUTRAL']
+        return None
+
+    def _sort_rows(self, sort):
+        """ get base variant rows of a QuestSortID, snapshots without
+        SORTINDEX get it built by a single pass over the records """
+        if self._sortindex is None:
+            rows = collections.defaultdict(list)
+            end = self._recs + len(self._qids) * RECORD.size
+            for row, rec in enumerate(
+                    RECORD.iter_unpack(self._buf[self._recs:end])):
+                rows[rec[2]].append(row)
+            self._sortindex = {}
+            self._sortrows = array.array('I')
+            for key in sorted(rows):
+                self._sortindex[key] = (len(self._sortrows), len(rows[key]))
+                self._sortrows.extend(rows[key])
+        start, count = self._sortindex.get(sort, (0, 0))
+        return self._sortrows[start:start + count]
+
+    def find_by_sort(self, sorts, races=0, classes=0):
+        """ get sets of QIDs for each QuestSortID available to races/classes
+
+        Only the rows of the sorts are read. The faction bitsets answer
+        faction race masks, other filters read the requirements of these
+        rows. Quests of an overlay replace their base rows.
+        """
+        factions = None if classes != 0 else self._faction_rows(races)
+        overlay = collections.defaultdict(list)
+        if self._overlay is not None:
+            end = self._overlay_recs + len(self._overlay) * RECORD.size
+            for qid, rec in zip(self._overlay, RECORD.iter_unpack(
+                    self._buf[self._overlay_recs:end])):
+                overlay[rec[2]].append((qid, rec[11:13]))
+
+        result = {}
+        for sort in sorts:
+            rows = self._sort_rows(sort)
+            if factions is not None:
+                rows = [row for row in rows if any(
+                    bits[row // 8] & (1 << (row % 8)) for bits in factions)]
+            elif races != 0 or classes != 0:
+                rows = [row for row in rows if available(RECORD.unpack_from(
+                    self._buf, self._recs + row * RECORD.size)[11:13],
+                    races, classes)]
+            qids = {self._qids[row] for row in rows}
+            if self._overlay is not None:
+                qids.difference_update(self._hidden)
+                qids.update(qid for qid, reqs in overlay[sort]
+                            if available(reqs, races, classes))
+            result[sort] = qids
+        return result
+
+
+class Quest(collections.abc.Mapping):
+    """ read-only QUESTS style view on a single row of a QuestTable """
+    __slots__ = ('_table', '_row')
+
+    # keys of a QUESTS style dict
+    KEYS = ('name', 'sort', 'info', 'lvls', 'link', 'reqs', 'diff')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __getitem__(self, key):
+        table = self._table
+        row = self._row
+        if key == 'name':
+            return table.names[row]
+        if key == 'sort':
+            return table.sort[row]
+        if key == 'info':
+            return table.info[row]
+        if key == 'lvls':
+            return (table.level[row], table.minlevel[row], table.maxlevel[row])
+        if key == 'link':
+            return (table.prev[row], table.next[row], table.exclusive[row],
+                    table.rewardnext[row])
+        if key == 'reqs':
+            return (table.races[row], table.classes[row])
+        if key == 'diff':
+            return table.diff[row]
+        raise KeyError(key)
+
+
+class QuestTable(collections.abc.Mapping):
+    """ read-only QUESTS mapping stored as one packed array per field
+
+    Rows are dense and sorted by QID, quests are returned as Quest views
+    on their row instead of separate dicts with nested tuples.
+    """
+
+    def __init__(self, quests):
+        self.qids = array.array('I')
+        self.names = []
+        self.sort = array.array('i')
+        self.info = array.array('H')
+        self.level = array.array('h')
+        self.minlevel = array.array('h')
+        self.maxlevel = array.array('h')
+        self.prev = array.array('i')
+        self.next = array.array('i')
+        self.exclusive = array.array('i')
+        self.rewardnext = array.array('i')
+        self.races = array.array('I')
+        self.classes = array.array('I')
+        self.diff = array.array('B')
+        self._bysort = None
+        for qid, quest in sorted(quests.items()):
+            self.qids.append(qid)
+            self.names.append(quest['name'])
+            self.sort.append(quest['sort'])
+            self.info.append(quest['info'])
+            self.level.append(quest['lvls'][0])
+            self.minlevel.append(quest['lvls'][1])
+            self.maxlevel.append(quest['lvls'][2])
+            self.prev.append(quest['link'][0])
+            self.next.append(quest['link'][1])
+            self.exclusive.append(quest['link'][2])
+            self.rewardnext.append(quest['link'][3])
+            self.races.append(quest['reqs'][0])
+            self.classes.append(quest['reqs'][1])
+            self.diff.append(quest['diff'])
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """ build table from the records of a QuestSnapshot """
+        table = cls({})
+        columns = (table.sort, table.info, table.level, table.minlevel,
+                   table.maxlevel, table.prev, table.next, table.exclusive,
+                   table.rewardnext, table.races, table.classes, table.diff)
+        for qid, name, fields in snapshot.records():
+            table.qids.append(qid)
+            table.names.append(name)
+            for column, value in zip(columns, fields):
+                column.append(value)
+        return table
+
+    def titles(self):
+        """ iterate over (qid, name, sort, races) of all quests """
+        return zip(self.qids, self.names, self.sort, self.races)
+
+    def _sort_rows(self, sort):
+        """ get rows of a QuestSortID, indexed on first use """
+        if self._bysort is None:
+            self._bysort = collections.defaultdict(lambda: array.array('I'))
+            for row, key in enumerate(self.sort):
+                self._bysort[key].append(row)
+        return self._bysort.get(sort, ())
+
+    def row(self, qid):
+        """ get dense row number of a qid or None """
+        if not isinstance(qid, int):
+            return None
+        return search(self.qids, qid)
+
+    def __len__(self):
+        return len(self.qids)
+
+    def __iter__(self):
+        return iter(self.qids)
+
+    def __contains__(self, qid):
+        return self.row(qid) is not None
+
+    def __getitem__(self, qid):
+        row = self.row(qid)
+        if row is None:
+            raise KeyError(qid)
+        return Quest(self, row)
+
+    def find_by_sort(self, sorts, races=0, classes=0):
+        """ get sets of QIDs for each QuestSortID available to races/classes,
+        only the rows of the sorts are read """
+        result = {}
+        for sort in sorts:
+            result[sort] = {
+                self.qids[row] for row in self._sort_rows(sort)
+                if available((self.races[row], self.classes[row]),
+                             races, classes)}
+        return result
+
+
+class SqliteWriter:
+    """ incrementally write quests into an indexed SQLite quest store """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            DROP TABLE IF EXISTS quests;
+            CREATE TABLE quests (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                sort INTEGER,
+                info INTEGER,
+                level INTEGER,
+                minlevel INTEGER,
+                maxlevel INTEGER,
+                prev INTEGER,
+                next INTEGER,
+                exclusive INTEGER,
+                rewardnext INTEGER,
+                races INTEGER,
+                classes INTEGER,
+                diff INTEGER);""")
+
+    def add(self, qid, quest):
+        self._db.execute(
+            "INSERT INTO quests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (qid, quest['name'], quest['sort'], quest['info'], *quest['lvls'],
+             *quest['link'], *quest['reqs'], quest['diff']))
+
+    def close(self):
+        # indexes are created last so inserting does not have to update them,
+        # they cover the race and class masks so filtering is index only
+        self._db.executescript("""
+            CREATE INDEX quests_sort ON quests (sort, races, classes);
+            CREATE INDEX quests_reqs ON quests (races, classes);""")
+        self._db.commit()
+        self._db.close()
+
+
+def write_sqlite(path, quests):
+    """ write a QUESTS dict into an indexed SQLite quest store """
+    writer = SqliteWriter(path)
+    for qid in sorted(quests):
+        writer.add(qid, quests[qid])
+    writer.close()
+
+
+class QuestStore(collections.abc.Mapping):
+    """ read-only QUESTS mapping on an indexed SQLite quest store """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute("SELECT id FROM quests LIMIT 1")
+        self._cache = {}
+
+    @staticmethod
+    def _decode(row):
+        """ decode a row of the quests table into a QUESTS style dict """
+        return {
+            'name': row[1],
+            'sort': row[2],
+            'info': row[3],
+            'lvls': tuple(row[4:7]),
+            'link': tuple(row[7:11]),
+            'reqs': tuple(row[11:13]),
+            'diff': row[13]
+        }
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM quests").fetchone()[0]
+
+    def __iter__(self):
+        for row in self._db.execute("SELECT id FROM quests ORDER BY id"):
+            yield row[0]
+
+    def __getitem__(self, qid):
+        if qid in self._cache:
+            return self._cache[qid]
+        if not isinstance(qid, int):
+            raise KeyError(qid)
+        row = self._db.execute(
+            "SELECT * FROM quests WHERE id = ?", (qid,)).fetchone()
+        if row is None:
+            raise KeyError(qid)
+        quest = self._cache[qid] = self._decode(row)
+        return quest
+
+    def items(self):
+        """ iterate over all quests without adding them to the cache """
+        for row in self._db.execute("SELECT * FROM quests ORDER BY id"):
+            yield row[0], self._decode(row)
+
+    def titles(self):
+        """ iterate over (qid, name, sort, races) of all quests """
+        return self._db.execute(
+            "SELECT id, name, sort, races FROM quests ORDER BY id")
+
+    def find_by_sort(self, sorts, races=0, classes=0):
+        """ get sets of QIDs for each QuestSortID available to races/classes """
+        sorts = list(sorts)
+        result = {sort: set() for sort in sorts}
+        if not sorts:
+            return result
+        rows = self._db.execute(
+            """SELECT sort, id FROM quests
+            WHERE sort IN (%s)
+                AND (? = 0 OR races = 0 OR races & ?)
+                AND (? = 0 OR classes = 0 OR classes & ?)""" % (
+                ','.join('?' * len(sorts))),
+            (*sorts, races, races, classes, classes))
+        for sort, qid in rows:
+            result[sort].add(qid)
+        return result
+
+
+def normalize_title(title):
+    """ fold case, punctuation and whitespace of a quest title """
+    return ' '.join(re.sub(r'[^\w\s]', '', title.casefold()).split())
+
+
+class TitleIndex:
+    """ index of QIDs by normalized quest title
+
+    Titles can be used by several quests, these are told apart by their
+    QuestSortID and the races they are available to. Packed quest sources
+    provide these columns without decoding whole quests.
+    """
+
+    def __init__(self, quests):
+        self._titles = collections.defaultdict(list)
+        if hasattr(quests, 'titles'):
+            titles = quests.titles()
+        else:
+            titles = ((qid, quest['name'], quest['sort'], quest['reqs'][0])
+                      for qid, quest in quests.items())
+        for qid, name, sort, races in titles:
+            if name:
+                self._titles[normalize_title(name)].append((qid, sort, races))
+
+    def find(self, title, sort=None, races=0, strict=False):
+        """ get QIDs with a title, narrowed down by sort and races
+
+        Unless strict is set, a filter leaving no candidate is ignored.
+        """
+        candidates = self._titles.get(normalize_title(title), [])
+        if sort is not None:
+            candidates = [entry for entry in candidates
+                          if entry[1] == sort] or \
+                ([] if strict else candidates)
+        if races != 0:
+            candidates = [entry for entry in candidates
+                          if entry[2] == 0 or entry[2] & races] or \
+                ([] if strict else candidates)
+        return [entry[0] for entry in candidates]
+
+
+def available(reqs, races=0, classes=0):
+    """ check if a quest with reqs (AllowableRaces, AllowableClasses) is
+    available to races and classes, 0 stands for all of them """
+    return (races == 0 or reqs[0] == 0 or reqs[0] & races != 0) and \
+        (classes == 0 or reqs[1] == 0 or reqs[1] & classes != 0)
+
+
+def scan_by_sort(quests, sorts, races=0, classes=0):
+    """ get sets of QIDs for each QuestSortID with a single pass over quests """
+    result = {sort: set() for sort in sorts}
+    for qid, quest in quests.items():
+        if quest['sort'] in result and \
+                available(quest['reqs'], races, classes):
+            result[quest['sort']].add(qid)
+    return result
+
+
+def find_by_sort(quests, sorts, races=0, classes=0):
+    """ get sets of QIDs for each QuestSortID available to races/classes """
+    if hasattr(quests, 'find_by_sort'):
+        return quests.find_by_sort(sorts, races, classes)
+    return scan_by_sort(quests, sorts, races, classes)
+
+
+def load(path, variant=None, packed=False):
+    """ load QUESTS from a binary snapshot, SQLite store or python module
+
+    The variant is only used to select one of several in a binary snapshot.
+    Quests of a binary snapshot are read into a QuestTable if packed is set
+    instead of being decoded into dicts on access.
+    """
+    with open(path, 'rb') as snapshot:
+        magic = snapshot.read(len(SQLITE_MAGIC))
+    try:
+        if not magic.startswith(SNAPSHOT_MAGIC) and variant is not None:
+            raise ValueError("No variant '%s' in %s" % (variant, path))
+        if magic.startswith(SNAPSHOT_MAGIC):
+            if packed:
+                return QuestTable.from_snapshot(QuestSnapshot(path, variant))
+            return QuestSnapshot(path, variant)
+        if magic == SQLITE_MAGIC:
+            return QuestStore(path)
+        return runpy.run_path(path)['QUESTS']
+    except (SyntaxError, KeyError, sqlite3.Error) as err:
+        raise ValueError("Could not read quests from %s: %s" % (path, err))
+
+
+def load_info(path, variant=None):
+    """ get area information of a variant and the base variant name of a
+    quest source, (None, None) if it is not a binary snapshot """
+    with open(path, 'rb') as snapshot:
+        magic = snapshot.read(len(SQLITE_MAGIC))
+    if not magic.startswith(SNAPSHOT_MAGIC):
+        return None, None
+    snapshot = QuestSnapshot(path, variant)
+    return snapshot.info(), (snapshot.variants or [None])[0]
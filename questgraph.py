@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import collections
+
+
+class QuestGraph:
+    """ prerequisite graph of quests built from the QUESTS 'link' tuples
+
+    Every quest gets a dense index, the transitive closure of prerequisites
+    is stored per quest as an int bitset over these indexes. Closures are
+    computed on first use and memoized, so each chain is only walked once.
+    """
+
+    def __init__(self, quests):
+        self.qids = sorted(quests)
+        self.index = {qid: pos for pos, qid in enumerate(self.qids)}
+
+        # direct prerequisites, negative QIDs have to be active only
+        self.requires = collections.defaultdict(set)
+        self.groups = collections.defaultdict(list)
+        self.group = {}
+        for qid, quest in quests.items():
+            prev, nextqid, exclusive, rewardnext = quest['link']
+            if prev != 0 and abs(prev) in self.index:
+                self.requires[qid].add(prev)
+            if nextqid > 0 and nextqid in self.index:
+                self.requires[nextqid].add(qid)
+            if rewardnext > 0 and rewardnext in self.index:
+                self.requires[rewardnext].add(qid)
+            if exclusive != 0:
+                self.groups[exclusive].append(qid)
+                self.group[qid] = exclusive
+
+        # memoized closures and chain depths
+        self._closure = {}
+        self._depth = {}
+
+    def _resolve(self, qid):
+        """ calculate closure and depth of qid and all its prerequisites """
+        stack = [qid]
+        active = set()
+        while stack:
+            current = stack[-1]
+            if current in self._closure:
+                stack.pop()
+                continue
+            active.add(current)
+            pending = [abs(prev) for prev in self.requires.get(current, ())
+                       if abs(prev) not in self._closure and
+                       abs(prev) not in active]
+            if pending:
+                stack.extend(pending)
+                continue
+
+            # all prerequisites resolved, edges back into a cycle are ignored
+            closure = 0
+            depth = 0
+            for prev in self.requires.get(current, ()):
+                prev = abs(prev)
+                if prev not in self._closure:
+                    continue
+                closure |= self._closure[prev] | (1 << self.index[prev])
+                depth = max(depth, self._depth[prev] + 1)
+            self._closure[current] = closure
+            self._depth[current] = depth
+            active.discard(current)
+            stack.pop()
+
+    def closure(self, qid):
+        """ get bitset of all quests that have to be done before qid """
+        if qid not in self.index:
+            return 0
+        if qid not in self._closure:
+            self._resolve(qid)
+        return self._closure[qid]
+
+    def bitset(self, qids):
+        """ get bitset of a collection of QIDs """
+        bits = 0
+        for qid in qids:
+            if qid in self.index:
+                bits |= 1 << self.index[qid]
+        return bits
+
+    def decode(self, bits):
+        """ get list of QIDs in a bitset """
+        qids = []
+        while bits:
+            low = bits & -bits
+            qids.append(self.qids[low.bit_length() - 1])
+            bits ^= low
+        return qids
+
+    def is_before(self, qid, other):
+        """ check if qid has to be done before other """
+        if qid not in self.index:
+            return False
+        return bool(self.closure(other) >> self.index[qid] & 1)
+
+    def chain(self, qid):
+        """ get all quests leading to qid, ordered from start of the chain """
+        qids = self.decode(self.closure(qid))
+        return sorted(qids, key=lambda prev: (self._depth[prev], prev))
+
+    def exclusive(self, qid):
+        """ get other quests in the exclusive group of qid """
+        if qid not in self.group:
+            return []
+        return [other for other in self.groups[self.group[qid]]
+                if other != qid]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import bisect
+
+
+class KDTree:
+    """ static 2-d tree over points for nearest neighbour lookups """
+
+    def __init__(self, points):
+        self.points = [(float(x), float(y)) for x, y in points]
+        self._root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indexes, axis):
+        """ build a node (index, axis, left, right) from point indexes """
+        if not indexes:
+            return None
+        indexes.sort(key=lambda index: (self.points[index][axis], index))
+        median = len(indexes) // 2
+        return (indexes[median], axis,
+                self._build(indexes[:median], 1 - axis),
+                self._build(indexes[median + 1:], 1 - axis))
+
+    def nearest(self, x, y):
+        """ get index of the point nearest to x, y or None without points
+
+        Points with the same distance are resolved to the lowest index, so
+        the result matches a stable sort of the points by distance.
+        """
+        best = None
+        bestdist = float('inf')
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None or bound > bestdist:
+                continue
+            index, axis, left, right = node
+            px, py = self.points[index]
+            dist = (px - x) ** 2 + (py - y) ** 2
+            if dist < bestdist or (dist == bestdist and index < best):
+                best = index
+                bestdist = dist
+
+            # the far side can only hold a better point if the splitting
+            # line is not farther away than the best match, it is checked
+            # again when taken from the stack after the near side
+            delta = (x, y)[axis] - (px, py)[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            stack.append((far, delta ** 2))
+            stack.append((near, 0.0))
+        return best
+
+
+class BoxIndex:
+    """ static slab index over closed axis aligned boxes for point queries
+
+    The x axis is split into slabs at the x edges of all boxes and each slab
+    lists the boxes overlapping it, so a query bisects the slab of a point
+    and only tests the boxes of that slab.
+    """
+
+    def __init__(self, boxes, values=None):
+        # boxes as (xmin, xmax, ymin, ymax), values default to box indexes
+        boxes = [tuple(box) for box in boxes]
+        if values is None:
+            values = range(len(boxes))
+        entries = [(*box, value) for box, value in zip(boxes, values)]
+        self.bounds = sorted({edge for box in boxes for edge in box[:2]})
+        slabs = list(zip(self.bounds, self.bounds[1:])) or \
+            [(edge, edge) for edge in self.bounds]
+        self.slabs = [[entry for entry in entries
+                       if entry[0] <= high and entry[1] >= low]
+                      for low, high in slabs]
+
+    def query(self, x, y):
+        """ get values of all boxes containing x, y in order of the boxes """
+        bounds = self.bounds
+        if not bounds or not bounds[0] <= x <= bounds[-1]:
+            return []
+        slab = min(bisect.bisect_right(bounds, x), len(self.slabs)) - 1
+        return [value for xmin, xmax, ymin, ymax, value in self.slabs[slab]
+                if xmin <= x <= xmax and ymin <= y <= ymax]
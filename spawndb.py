@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import mmap
+import struct
+import questdb
+
+# sections of the looked up spawns by kind, each with a sorted KEYS section
+# of quest ids or maps and a STARTS section of first rows in SPAWNS
+STARTER_KINDS = (b'SNPC', b'SOBJ', b'SITEM')
+ENDER_KINDS = (b'ENPC', b'EOBJ')
+FLIGHTMASTER_KIND = b'FLIGHT'
+
+# fixed width spawn record: name offset, name length, map, x, y,
+# items store their entry as map and no position
+SPAWN = struct.Struct('<IHidd')
+
+
+def write_spawns(stream, kinds):
+    """ write spawn snapshot of kinds, a dict of kind to dict of key to rows
+
+    Rows of creatures, gameobjects and flight masters are (name, map, x, y)
+    tuples, rows of items are (name, entry) tuples.
+    """
+    strs = bytearray()
+    names = {}
+    spawns = bytearray()
+    sections = []
+    num = 0
+    for kind in (*STARTER_KINDS, *ENDER_KINDS, FLIGHTMASTER_KIND):
+        keys = sorted(kinds.get(kind, {}))
+        starts = []
+        for key in keys:
+            starts.append(num)
+            for row in kinds[kind][key]:
+                name = row[0].encode('utf-8')
+                if name not in names:
+                    names[name] = len(strs)
+                    strs += name
+                if kind == b'SITEM':
+                    row = (row[0], row[1], 0.0, 0.0)
+                spawns += SPAWN.pack(names[name], len(name), *row[1:])
+                num += 1
+        starts.append(num)
+        sections.append((kind + b'.KEYS', questdb.pack_uints(keys)))
+        sections.append((kind + b'.STARTS', questdb.pack_uints(starts)))
+    questdb.write_sections(
+        stream, [(b'SPAWNS', bytes(spawns)), (b'STRS', bytes(strs))] + sections)
+
+
+class SpawnSnapshot:
+    """ memory mapped quest starters, enders and flight masters
+
+    Rows are returned in the same form as the database queries of filter.py
+    return them, spawns of a quest or map are found by bisecting its keys.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot:
+            self._buf = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        sections = questdb.read_sections(self._buf)
+        if b'SPAWNS' not in sections:
+            raise ValueError("Not a spawn snapshot")
+        self._spawns = sections[b'SPAWNS'][0]
+        self._strs = sections[b'STRS'][0]
+        self._kinds = {}
+        for kind in (*STARTER_KINDS, *ENDER_KINDS, FLIGHTMASTER_KIND):
+            self._kinds[kind] = (
+                questdb.uint_view(self._buf, *sections[kind + b'.KEYS']),
+                questdb.uint_view(self._buf, *sections[kind + b'.STARTS']))
+
+    def _rows(self, kind, key):
+        """ get rows of a kind for a quest id or map """
+        keys, starts = self._kinds[kind]
+        pos = questdb.search(keys, key)
+        if pos is None:
+            return []
+        rows = []
+        for num in range(starts[pos], starts[pos + 1]):
+            offset, length, map, x, y = SPAWN.unpack_from(
+                self._buf, self._spawns + num * SPAWN.size)
+            name = self._buf[self._strs + offset:
+                             self._strs + offset + length].decode('utf-8')
+            rows.append((name, map) if kind == b'SITEM' else (name, map, x, y))
+        return rows
+
+    def starters(self, qid):
+        """ get creatures, gameobjects and items starting a quest """
+        return tuple(self._rows(kind, qid) for kind in STARTER_KINDS)
+
+    def enders(self, qid):
+        """ get creatures and gameobjects ending a quest """
+        return tuple(self._rows(kind, qid) for kind in ENDER_KINDS)
+
+    def flight_masters(self, map):
+        """ get flight masters on a map """
+        return self._rows(FLIGHTMASTER_KIND, map)
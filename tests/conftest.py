@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dbbackend  # noqa: E402
+
+
+@pytest.fixture
+def world(tmp_path):
+    """ empty SQLite world database, returns connection and file name """
+    dbname = str(tmp_path / 'world.sqlite')
+    backend = dbbackend.SqliteBackend(dbname, create=True)
+    yield backend.connection, dbname
+    backend.close()
+
+
+@pytest.fixture
+def run_filter(tmp_path):
+    """ run filter.py on a guide, returns the completed process """
+    def run(steps, *args, zone='Elwynn Forest'):
+        guide = tmp_path / 'guide.lua'
+        guide.write_text(
+            "local guide = WoWPro:RegisterGuide('Test', 'Leveling', "
+            "'%s', 'Author', 'Alliance')\n"
+            "WoWPro:GuideSteps(guide, function()\nreturn [[\n%s\n]]\n"
+            "end)\n" % (zone, '\n'.join(steps)))
+        return subprocess.run(
+            [sys.executable, os.path.join(ROOT, 'filter.py')] +
+            list(args) + [str(guide)],
+            cwd=ROOT, capture_output=True, text=True)
+    return run
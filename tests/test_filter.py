@@ -0,0 +1,111 @@
+import sqlite3
+
+
+def add_quest(connection, qid, title, prev=0):
+    connection.execute(
+        'INSERT INTO quest_template (ID, QuestLevel, MinLevel, LogTitle) '
+        'VALUES (?, 5, 1, ?)', (qid, title))
+    connection.execute(
+        'INSERT INTO quest_template_addon (ID, PrevQuestID) VALUES (?, ?)',
+        (qid, prev))
+
+
+def test_chains_with_unknown_quest(world, run_filter):
+    connection, dbname = world
+    add_quest(connection, 60, 'Kobold Candles')
+    add_quest(connection, 61, 'Shipment to Stormwind', prev=60)
+    connection.commit()
+
+    result = run_filter([
+        'A Shipment to Stormwind|QID|61|',
+        'A Kobold Candles|QID|60|',
+        'T Kobold Candles|QID|60|',
+        'A Unknown|QID|99999|',
+    ], '-d', '--backend', 'sqlite', '--dbname', dbname, '-c')
+    assert result.returncode == 0, result.stderr
+    assert 'QID 61 accepted before prerequisite QID 60' in result.stderr
+
+
+def test_cache_with_malformed_qid(world, run_filter, tmp_path):
+    connection, dbname = world
+    add_quest(connection, 60, 'Kobold Candles')
+    connection.commit()
+
+    cachedir = str(tmp_path / 'cache')
+    for _ in range(2):
+        result = run_filter([
+            'A Bad QID|QID|12a|',
+            'A Kobold Candles|QID|60|',
+        ], '-d', '--backend', 'sqlite', '--dbname', dbname,
+            '--cache-dir', cachedir)
+        assert result.returncode == 0, result.stderr
+        assert "QID '12a' could not be parsed" in result.stderr
+
+    cache = sqlite3.connect(str(tmp_path / 'cache' / 'dblookups.sqlite'))
+    assert (60,) in cache.execute(
+        "SELECT key FROM lookups WHERE kind = 'quest'").fetchall()
+
+
+def test_async_matches_sync(world, run_filter):
+    connection, dbname = world
+    for qid in range(1, 301):
+        add_quest(connection, qid, 'Quest %d' % qid, prev=qid - 1)
+    connection.commit()
+
+    # several blocks of the pipeline, with quests spanning blocks
+    steps = []
+    for qid in range(1, 301):
+        steps.extend(['A Quest %d|QID|%d|' % (qid, qid),
+                      'T Quest %d|QID|%d|' % (qid - 1, qid - 1)])
+    steps.append('A Unknown|QID|99999|')
+    args = ['-d', '--backend', 'sqlite', '--dbname', dbname]
+    sync = run_filter(steps, *args)
+    async_ = run_filter(steps, '--async', *args)
+    assert async_.returncode == 0, async_.stderr
+    assert (async_.stdout, async_.stderr) == (sync.stdout, sync.stderr)
+
+
+def test_alternatives_prefer_zone_of_first_result(world, run_filter):
+    connection, dbname = world
+    add_quest(connection, 60, 'Kobold Candles')
+    # first starter only in Elwynn Forest, second where Westfall overlaps
+    connection.executemany(
+        'INSERT INTO creature_template (entry, name) VALUES (?, ?)',
+        [(1, 'William Pestle'), (2, 'Remy Two Times')])
+    connection.executemany(
+        'INSERT INTO creature (guid, id, map, position_x, position_y) '
+        'VALUES (?, ?, 0, ?, ?)',
+        [(1, 1, -9096.8765, -1241.2502), (2, 2, -10000.1325, 1299.9169)])
+    connection.executemany(
+        'INSERT INTO creature_queststarter (id, quest) VALUES (?, 60)',
+        [(1,), (2,)])
+    connection.commit()
+
+    result = run_filter(['A Kobold Candles|QID|60|'],
+                        '-d', '--backend', 'sqlite', '--dbname', dbname,
+                        zone='Westfall')
+    assert result.returncode == 0, result.stderr
+    assert 'A Kobold Candles|QID|60|M|80.00,50.01|Z|Elwynn Forest|' \
+        in result.stdout
+    assert '; ALT: A Kobold Candles|QID|60|M|6.79,89.03|Z|Elwynn Forest|' \
+        in result.stdout
+
+
+def test_missing_sqlite_database(run_filter, tmp_path):
+    dbname = str(tmp_path / 'typo')
+    result = run_filter(['A Kobold Candles|QID|60|'],
+                        '-d', '--backend', 'sqlite', '--dbname', dbname)
+    assert result.returncode == 1
+    assert 'No SQLite database' in result.stderr
+    assert not (tmp_path / 'typo.sqlite').exists()
+
+
+def test_title_lookup_disabled_once(world, run_filter):
+    connection, dbname = world
+    result = run_filter([
+        'A Kobold Candles|',
+        'C Kobold Candles|',
+        'T Kobold Candles|',
+    ], '-d', '--backend', 'sqlite', '--dbname', dbname)
+    assert result.returncode == 0, result.stderr
+    assert result.stderr.count('disabled with the database') == 1
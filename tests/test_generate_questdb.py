@@ -0,0 +1,78 @@
+import os
+import sys
+import subprocess
+import pytest
+import questdb
+import filter_questdb_pre
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def add_quest(connection, qid, quest):
+    connection.execute(
+        'INSERT OR REPLACE INTO quest_template (ID, LogTitle, QuestLevel, '
+        'MinLevel, QuestSortID, QuestInfoID, RewardNextQuest, '
+        'RewardXPDifficulty, AllowableRaces) VALUES (?, ?, ?, ?, ?, ?, ?, '
+        '?, ?)',
+        (qid, quest['name'], quest['lvls'][0], quest['lvls'][1],
+         quest['sort'], quest['info'], quest['link'][3], quest['diff'],
+         quest['reqs'][0]))
+    connection.execute(
+        'INSERT OR REPLACE INTO quest_template_addon (ID, MaxLevel, '
+        'PrevQuestID, NextQuestID, ExclusiveGroup, AllowableClasses) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (qid, quest['lvls'][2], quest['link'][0], quest['link'][1],
+         quest['link'][2], quest['reqs'][1]))
+
+
+@pytest.fixture
+def quests(world):
+    """ world database with a sample of the quests, one without title """
+    connection, dbname = world
+    quests = {qid: filter_questdb_pre.QUESTS[qid]
+              for qid in sorted(filter_questdb_pre.QUESTS)[:200:4]}
+    quests[99999] = dict(quests[min(quests)], name=None)
+    for qid, quest in quests.items():
+        add_quest(connection, qid, quest)
+    connection.commit()
+    return quests
+
+
+def generate(dbname, *args):
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'generate_questdb.py'),
+         '--backend', 'sqlite', '--dbname', dbname] + list(args),
+        cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result
+
+
+def test_stream_matches_module(world, quests, tmp_path):
+    connection, dbname = world
+    generate(dbname, '-o', str(tmp_path / 'full.py'))
+    generate(dbname, '-s', '-o', str(tmp_path / 'stream.py'))
+    streamed = (tmp_path / 'stream.py').read_text()
+    assert streamed == (tmp_path / 'full.py').read_text()
+    assert questdb.load(str(tmp_path / 'stream.py')) == quests
+
+
+def test_incremental_matches_full(world, quests, tmp_path):
+    connection, dbname = world
+    generate(dbname, '-o', str(tmp_path / 'old.py'))
+
+    # change, remove and add quests
+    qids = sorted(quests)
+    add_quest(connection, qids[0], dict(quests[qids[0]], name='Changed'))
+    add_quest(connection, 99999, dict(quests[99999], diff=3))
+    connection.execute('DELETE FROM quest_template WHERE ID = ?', (qids[1],))
+    add_quest(connection, 99998, quests[qids[2]])
+    connection.commit()
+
+    result = generate(dbname, '-i', str(tmp_path / 'old.py'),
+                      '-o', str(tmp_path / 'new.py'))
+    generate(dbname, '-o', str(tmp_path / 'full.py'))
+    assert (tmp_path / 'new.py').read_text() == \
+        (tmp_path / 'full.py').read_text()
+    assert 'Added 1 quests: 99998' in result.stderr
+    assert 'Removed 1 quests: %d' % qids[1] in result.stderr
+    assert 'Changed 2 quests: %d, 99999' % qids[0] in result.stderr
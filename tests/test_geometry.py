@@ -0,0 +1,112 @@
+import math
+import random
+import pytest
+import geometry
+import filter_info_pre
+
+AREAS = filter_info_pre.AREAS
+
+# zones requested in the conversions, None and one that doesn't exist
+ZONES = [None, 'Elwynn Forest', 'Durotar', 'Azeroth', 'Nowhere']
+
+
+def reference_coords(map, posX, posY, zone=None):
+    """ zone pick of get_thott_coords() before the AreaTable """
+    if map not in AREAS:
+        return None
+    area = None
+    tmap = None
+    thottX = None
+    thottY = None
+    tdist = 71.0
+    for zname, zinfo in AREAS[map].items():
+        if not zinfo[1] >= posY >= zinfo[2] or \
+                not zinfo[3] >= posX >= zinfo[4]:
+            continue
+        tX = (posY - zinfo[1]) / (zinfo[2] - zinfo[1]) * 100
+        tY = (posX - zinfo[3]) / (zinfo[4] - zinfo[3]) * 100
+        tD = math.sqrt((50.0 - tX) ** 2 + (50.0 - tY) ** 2)
+        if zone is not None and zone == zname:
+            return tX, tY, zname
+        if area is None or tmap == 0 or (zinfo[0] > 0 and tdist > tD):
+            area = zname
+            tmap = zinfo[0]
+            thottX = tX
+            thottY = tY
+            tdist = tD
+    if area is None:
+        return None
+    return thottX, thottY, area
+
+
+@pytest.fixture(scope='module')
+def positions():
+    """ box corners of all zones and a seeded sample of positions """
+    points = []
+    for map, zones in AREAS.items():
+        for zinfo in zones.values():
+            for posX in zinfo[3:5]:
+                for posY in zinfo[1:3]:
+                    points.append((map, posX, posY))
+    rand = random.Random(5)
+    maps = list(AREAS) + [9999]
+    for _ in range(5000):
+        points.append((rand.choice(maps), rand.uniform(-12000, 12000),
+                       rand.uniform(-12000, 12000)))
+    return points
+
+
+@pytest.fixture(scope='module')
+def expected(positions):
+    return {zone: [reference_coords(*point, zone) for point in positions]
+            for zone in ZONES}
+
+
+@pytest.fixture(scope='module')
+def gridfile(tmp_path_factory):
+    path = tmp_path_factory.mktemp('grid') / 'areas.grid'
+    with open(path, 'wb') as stream:
+        geometry.write_grid(stream, AREAS)
+    return str(path)
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'no-numpy'])
+def with_numpy(request, monkeypatch):
+    if request.param:
+        if geometry.import_numpy() is None:
+            pytest.skip('NumPy is not installed')
+    else:
+        monkeypatch.setattr(geometry, 'numpy', None)
+        monkeypatch.setattr(geometry, 'NUMPY_IMPORTED', True)
+    return request.param
+
+
+@pytest.mark.parametrize('grid', [False, True], ids=['index', 'grid'])
+def test_thott_coords(positions, expected, gridfile, grid):
+    table = geometry.AreaTable(AREAS, gridfile if grid else None)
+    for zone in ZONES:
+        assert [table.thott_coords(*point, zone) for point in positions] == \
+            expected[zone]
+        assert [table.cached_coords(*point, zone) for point in positions] == \
+            expected[zone]
+
+
+@pytest.mark.parametrize('grid', [False, True], ids=['index', 'grid'])
+def test_coords(positions, expected, gridfile, grid, with_numpy):
+    table = geometry.AreaTable(AREAS, gridfile if grid else None)
+    for zone in ZONES:
+        assert table.coords(*zip(*positions), zone=zone) == expected[zone]
+
+
+def test_to_world(positions, expected, with_numpy):
+    table = geometry.AreaTable(AREAS)
+    found = [(point, coords) for point, coords in
+             zip(positions, expected[None]) if coords is not None]
+    maps, xs, ys = table.to_world(
+        [coords[2] for point, coords in found],
+        [coords[0] for point, coords in found],
+        [coords[1] for point, coords in found])
+    for (point, coords), map, posX, posY in zip(found, maps, xs, ys):
+        assert (map, posX, posY) == pytest.approx(point)
+        assert table.world_coords(coords[2], coords[0], coords[1]) == \
+            pytest.approx(point)
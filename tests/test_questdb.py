@@ -0,0 +1,137 @@
+import io
+import pytest
+import questdb
+import filter_questdb_pre
+
+QUESTS = filter_questdb_pre.QUESTS
+
+# race masks checked by the QuestSortID lookups, factions use the bitsets
+RACES = [0, questdb.FACTION_RACES[b'ALLIANCE'],
+         questdb.FACTION_RACES[b'HORDE'], 1 + 2]
+
+
+@pytest.fixture(scope='module')
+def quests():
+    """ every fifth quest and one without title """
+    quests = {qid: QUESTS[qid] for qid in sorted(QUESTS)[::5]}
+    quests[99999] = dict(QUESTS[sorted(QUESTS)[0]], name=None)
+    return quests
+
+
+@pytest.fixture(scope='module')
+def variant(quests):
+    """ quests of a second variant with changed, removed and added quests """
+    variant = dict(quests)
+    for qid in sorted(quests)[:50]:
+        variant[qid] = dict(quests[qid], name='Changed', sort=12)
+    for qid in sorted(quests)[50:100]:
+        del variant[qid]
+    variant[99998] = dict(quests[99999], name='Added', reqs=(2, 0))
+    return variant
+
+
+@pytest.fixture(scope='module')
+def snapshot(quests, tmp_path_factory):
+    path = tmp_path_factory.mktemp('questdb') / 'quests.qdb'
+    with open(path, 'wb') as stream:
+        questdb.write_snapshot(stream, quests)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def multi(quests, variant, tmp_path_factory):
+    path = tmp_path_factory.mktemp('questdb') / 'multi.qdb'
+    with open(path, 'wb') as stream:
+        writer = questdb.SnapshotWriter(stream, variant='pre')
+        for qid in sorted(quests):
+            writer.add(qid, quests[qid])
+        writer.add_overlay('post', variant, quests)
+        writer.add_info({'QUESTXP': {1: 2}, 'AREAS': {}, 'AREATABLE': {}})
+        writer.add_info(
+            {'QUESTXP': {1: 3}, 'AREAS': {}, 'AREATABLE': {}}, 'post')
+        writer.close()
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def store(quests, tmp_path_factory):
+    path = tmp_path_factory.mktemp('questdb') / 'quests.sqlite'
+    questdb.write_sqlite(str(path), quests)
+    return str(path)
+
+
+def as_dict(quests):
+    return {qid: {key: tuple(value) if isinstance(value, tuple) else value
+                  for key, value in quest.items()}
+            for qid, quest in quests.items()}
+
+
+@pytest.mark.parametrize('packed', [False, True], ids=['lazy', 'packed'])
+def test_snapshot_round_trip(quests, snapshot, packed):
+    loaded = questdb.load(snapshot, packed=packed)
+    assert len(loaded) == len(quests)
+    assert list(loaded) == sorted(quests)
+    assert as_dict(loaded) == quests
+    assert loaded[99999]['name'] is None
+    assert 0 not in loaded and '12a' not in loaded and None not in loaded
+    assert questdb.load_info(snapshot) == (None, None)
+
+
+@pytest.mark.parametrize('packed', [False, True], ids=['lazy', 'packed'])
+def test_variant_round_trip(quests, variant, multi, packed):
+    assert as_dict(questdb.load(multi, 'pre', packed)) == quests
+    assert as_dict(questdb.load(multi, 'post', packed)) == variant
+    assert questdb.load_info(multi, 'pre')[0]['QUESTXP'] == {1: 2}
+    assert questdb.load_info(multi, 'post') == (
+        {'QUESTXP': {1: 3}, 'AREAS': {}, 'AREATABLE': {}}, 'pre')
+    with pytest.raises(ValueError):
+        questdb.load(multi, 'wotlk')
+
+
+def test_store_round_trip(quests, store):
+    loaded = questdb.load(store)
+    assert len(loaded) == len(quests)
+    assert as_dict(loaded) == quests
+    with pytest.raises(ValueError):
+        questdb.load(store, 'pre')
+
+
+def test_module_round_trip(quests, tmp_path):
+    path = tmp_path / 'quests.py'
+    path.write_text('QUESTS = %r\n' % quests)
+    assert questdb.load(str(path)) == quests
+
+
+@pytest.mark.parametrize('source', ['snapshot', 'packed', 'pre', 'post',
+                                    'packed post', 'store'])
+def test_find_by_sort(quests, variant, snapshot, multi, store, source):
+    loaded = {
+        'snapshot': lambda: questdb.load(snapshot),
+        'packed': lambda: questdb.load(snapshot, packed=True),
+        'pre': lambda: questdb.load(multi, 'pre'),
+        'post': lambda: questdb.load(multi, 'post'),
+        'packed post': lambda: questdb.load(multi, 'post', True),
+        'store': lambda: questdb.load(store),
+    }[source]()
+    expected = variant if 'post' in source else quests
+    sorts = sorted({quest['sort'] for quest in expected.values()})[:40]
+    for races in RACES:
+        for classes in (0, 1, 4):
+            assert questdb.find_by_sort(loaded, sorts, races, classes) == \
+                questdb.scan_by_sort(expected, sorts, races, classes)
+
+
+@pytest.mark.parametrize('packed', [False, True], ids=['lazy', 'packed'])
+def test_title_index(quests, variant, multi, packed):
+    for name, expected in (('pre', quests), ('post', variant)):
+        index = questdb.TitleIndex(questdb.load(multi, name, packed))
+        for qid, quest in list(expected.items())[::25]:
+            if quest['name']:
+                assert qid in index.find(quest['name'].upper())
+
+
+def test_snapshot_order():
+    writer = questdb.SnapshotWriter(io.BytesIO())
+    writer.add(2, QUESTS[sorted(QUESTS)[0]])
+    with pytest.raises(ValueError):
+        writer.add(1, QUESTS[sorted(QUESTS)[0]])